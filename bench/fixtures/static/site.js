@@ -0,0 +1,59 @@
+// Minimal stand-in for the SweetAlert markup used by the site
+function swal(opts) {
+    document.querySelectorAll(".swal-overlay").forEach(el => el.remove());
+    const overlay = document.createElement("div");
+    overlay.className = "swal-overlay swal-overlay--show-modal";
+    overlay.innerHTML =
+        '<div class="swal-modal">' +
+        (opts.title ? '<div class="swal-title"></div>' : "") +
+        (opts.text ? '<div class="swal-text"></div>' : "") +
+        '<div class="swal-footer"><button class="swal-button swal-button--confirm">OK</button></div>' +
+        "</div>";
+    if (opts.title) overlay.querySelector(".swal-title").textContent = opts.title;
+    if (opts.text) overlay.querySelector(".swal-text").textContent = opts.text;
+    overlay.querySelector(".swal-button--confirm").addEventListener("click", () => {
+        overlay.remove();
+        if (opts.onConfirm) opts.onConfirm();
+    });
+    document.body.appendChild(overlay);
+}
+
+document.addEventListener("click", async (e) => {
+    const checkin = e.target.closest(".checkin-day-today-label-check");
+    if (checkin) {
+        checkin.remove();
+        swal({title: "+5 чайников", text: "Вы отметились"});
+        return;
+    }
+
+    const card = e.target.closest(".box-page-loot-cards-card");
+    if (card) {
+        swal({title: card.dataset.item});
+        return;
+    }
+
+    const join = e.target.closest(".give-join");
+    if (join) {
+        join.remove();
+        swal({title: "Вы в раздаче", text: "Удачи!"});
+        return;
+    }
+
+    const sell = e.target.closest(".inventory-item-link_sell");
+    if (sell) {
+        e.preventDefault();
+        swal({title: "Продать?", text: "Предмет будет продан", onConfirm: () => {
+            sell.replaceWith(Object.assign(document.createElement("span"), {textContent: "Продано"}));
+        }});
+        return;
+    }
+
+    const more = e.target.closest(".btn-more");
+    if (more) {
+        const page = Number(more.dataset.page);
+        const r = await fetch(`/profile/inventory?page=${page}`);
+        document.querySelector(".inventory-item-wrapper").insertAdjacentHTML("beforeend", await r.text());
+        more.dataset.page = page + 1;
+        if (page >= Number(more.dataset.last)) more.remove();
+    }
+});
@@ -0,0 +1,75 @@
+"""
+Micro-benchmark of sell decisions over large inventories.
+
+Usage:
+    python -m bench.policy --items 100000
+
+Compares the compiled policy with scanning the ignore list
+for every item, which is how decisions were made before.
+"""
+import argparse
+import random
+import sys
+import time
+
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.server import ITEM_NAMES
+from src.constants import IGNORE_ITEMS, CurrencyType
+from src.models import InventoryItem
+from src.policy import Policy
+
+def scan(items: list[InventoryItem]) -> list[bool]:
+    """Ignore list scan as done before the policy engine. """
+    return [
+        not any(ignored.lower() in i.name.lower() for ignored in IGNORE_ITEMS)
+        and i.currency_type is CurrencyType.COIN
+        for i in items
+    ]
+
+def generate(count: int) -> list[InventoryItem]:
+    rng = random.Random(0)
+    names = ITEM_NAMES + ["Оружие", "Артефакт", "Талант", "Книга опыта"]
+    return [
+        InventoryItem(
+            name=f"{rng.choice(names)} #{i}",
+            price=rng.randint(1, 50),
+            currency_type=rng.choice([CurrencyType.COIN, CurrencyType.GOLD]),
+        )
+        for i in range(count)
+    ]
+
+def measure(func, items, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(items)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoDailies policy micro-benchmark")
+    parser.add_argument("--items", type=int, default=100_000, help="Number of inventory items.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of each, the best is reported.")
+    args = parser.parse_args()
+
+    items = generate(args.items)
+    start = time.perf_counter()
+    policy = Policy(sell_inventory=True)
+    compile_time = time.perf_counter() - start
+
+    if scan(items) != policy.sell_decisions(items):
+        raise SystemExit("Policy decisions differ from the ignore list scan")
+
+    old = measure(scan, items, args.repeat)
+    new = measure(policy.sell_decisions, items, args.repeat)
+    print(f"{'method':<10}{'total, ms':>12}{'per item, us':>15}")
+    print(f"{'scan':<10}{old * 1000:>12.1f}{old / args.items * 1e6:>15.2f}")
+    print(f"{'policy':<10}{new * 1000:>12.1f}{new / args.items * 1e6:>15.2f}")
+    print(f"Policy compiled in {compile_time * 1000:.2f} ms, {old / new:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Offline benchmarks against the local fixture site.
+
+Usage:
+    python -m bench.run --chromium_path /usr/bin/chromium --chromedriver_path /usr/bin/chromedriver
+
+Reports wall time, number of WebDriver commands and peak memory
+of this process and all browsers it started for every scenario.
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.server import FixtureSite, serve
+
+CONFIG_TEMPLATE = """
+[flags]
+headless = true
+checkin = true
+giveaway = true
+cases = true
+sell_inventory = false
+
+[general]
+wait_timeout = 2
+workers = {workers}
+case_price_threshold = 1
+
+[browser]
+reuse = true
+lean = {lean}
+
+[pacing]
+giveaway_check = [0, 0]
+giveaway_join = [0, 0]
+case_cooldown = [0, 0]
+sell_confirm = [0, 0]
+sell_cooldown = [0, 0]
+load_more = [0, 0]
+typing = [0, 0]
+
+[paths]
+chromium_path = "{chromium_path}"
+chromedriver_path = "{chromedriver_path}"
+accounts_file = "accounts"
+"""
+
+@dataclass
+class Measurement:
+    scenario: str
+    wall: float = 0.0
+    commands: int = 0
+    peak_rss_mb: float = 0.0
+    error: str | None = None
+    top_commands: dict[str, int] = field(default_factory=dict)
+
+class CommandCounter:
+    """Counts WebDriver commands sent by all drivers. """
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def install(self):
+        from selenium.webdriver.remote.webdriver import WebDriver
+
+        execute = WebDriver.execute
+        counter = self
+
+        def counted(self, driver_command, params=None):
+            with counter._lock:
+                counter.counts[driver_command] += 1
+            return execute(self, driver_command, params)
+
+        WebDriver.execute = counted
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+class RssSampler(threading.Thread):
+    """Samples memory of this process and its children. """
+    def __init__(self, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        from src.browser import process_tree_memory_mb
+
+        while not self._stop_event.is_set():
+            try:
+                self.peak = max(self.peak, process_tree_memory_mb(os.getpid()))
+            except OSError:
+                pass
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> float:
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+def prepare(workdir: Path, args: argparse.Namespace, accounts: int) -> Path:
+    """Write config and account cookies for the fixture site. """
+    (workdir / "accounts").mkdir(parents=True, exist_ok=True)
+    for i in range(accounts):
+        cookies = [{"name": "session", "value": f"bench-{i}", "domain": "127.0.0.1", "path": "/"}]
+        with open(workdir / "accounts" / f"bench{i:03}.pkl", "wb") as f:
+            pickle.dump(cookies, f)
+
+    config = workdir / "config.toml"
+    config.write_text(CONFIG_TEMPLATE.format(
+        workers=args.workers,
+        lean=str(args.lean).lower(),
+        chromium_path=args.chromium_path,
+        chromedriver_path=args.chromedriver_path,
+    ))
+    return config
+
+def measure(name: str, counter: CommandCounter, func) -> Measurement:
+    """
+    Measure the scenario, it can call the passed `mark`
+    to start measuring only after its setup is done.
+    """
+    res = Measurement(name)
+    sampler = RssSampler()
+    start = 0.0
+
+    def mark():
+        nonlocal start
+        counter.reset()
+        start = time.perf_counter()
+
+    mark()
+    sampler.start()
+    try:
+        func(mark)
+    except Exception as e:
+        res.error = f"{type(e).__name__}: {e}"
+    res.wall = time.perf_counter() - start
+    res.peak_rss_mb = sampler.stop()
+    res.commands = sum(counter.counts.values())
+    res.top_commands = dict(counter.counts.most_common(5))
+    return res
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoDailies offline benchmarks")
+    parser.add_argument("--chromium_path", required=True, help="Path to the browser binary.")
+    parser.add_argument("--chromedriver_path", required=True, help="Path to the Chromedriver.")
+    parser.add_argument("--scenarios", type=str, default="", help="Comma separated scenarios to run, all by default.")
+    parser.add_argument("--workers", type=int, default=1, help="Workers used in multi account scenarios.")
+    parser.add_argument("--lean", action="store_true", help="Run with lean mode enabled.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fixture site takes to send every page.")
+    parser.add_argument("--json", type=str, help="Save results as JSON to this file.")
+    args = parser.parse_args()
+    output = Path(args.json).resolve() if args.json else None
+
+    site = FixtureSite(latency=args.latency)
+    server = serve(site)
+    os.environ["AUTODAILIES_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+
+    workdir = Path(tempfile.mkdtemp(prefix="autodailies-bench-"))
+    config = prepare(workdir, args, accounts=50)
+    os.chdir(workdir)
+
+    # Urls are read on import, so import after setting them up
+    from src.config import CONFIG, Config, configure
+    configure(Config(str(config), argv=[]))
+
+    from src import core
+    from src.browser import DriverPool, load_cookies
+    from src.actions.checkin import run_daily_checkin
+    from src.actions.giveaway import run_giveaway
+    from src.actions.case import run_cases
+    from src.actions.profile import run_profile
+    from src.constants import BASE_URL
+
+    counter = CommandCounter()
+    counter.install()
+    accounts = sorted(CONFIG.accounts.values())
+    pool = DriverPool()
+
+    def action(func, inventory: int = 10):
+        """Run a single action in a logged in browser. """
+        def run(mark):
+            site.inventory = inventory
+            with pool.driver() as driver:
+                driver.get(BASE_URL)
+                load_cookies(driver, accounts[0])
+                driver.refresh()
+                mark()
+                func(driver)
+        return run
+
+    def with_config(func, **values):
+        """Run the scenario with some config values changed. """
+        def run(mark):
+            saved = {k: getattr(CONFIG, k) for k in values}
+            for k, v in values.items():
+                setattr(CONFIG, k, v)
+            try:
+                func(mark)
+            finally:
+                for k, v in saved.items():
+                    setattr(CONFIG, k, v)
+        return run
+
+    def full_run(count: int, status: bool = False):
+        """Run the whole `run` for the first accounts. """
+        def run(mark):
+            site.inventory = 10
+            saved = {k: getattr(CONFIG, k) for k in ("status", "http_reads", "checkin", "giveaway", "cases")}
+            if status:
+                CONFIG.status = CONFIG.http_reads = True
+                CONFIG.checkin = CONFIG.giveaway = CONFIG.cases = False
+            try:
+                core.run(accounts=accounts[:count])
+            finally:
+                for k, v in saved.items():
+                    setattr(CONFIG, k, v)
+        return run
+
+    scenarios = {
+        "checkin": action(run_daily_checkin),
+        "giveaway": action(run_giveaway),
+        "giveaway-tabs": with_config(action(run_giveaway), giveaway_tabs=4),
+        "cases": action(run_cases),
+        "profile-10": action(run_profile, inventory=10),
+        "profile-500": action(run_profile, inventory=500),
+        "run-1": full_run(1),
+        "run-50": full_run(50),
+        "status-50": full_run(50, status=True),
+    }
+    selected = [s for s in args.scenarios.split(",") if s] or list(scenarios)
+
+    results = []
+    try:
+        for name in selected:
+            if name not in scenarios:
+                raise SystemExit(f"Unknown scenario: {name}. Use one of: {', '.join(scenarios)}")
+            results.append(measure(name, counter, scenarios[name]))
+    finally:
+        pool.close()
+        server.shutdown()
+
+    print(f"\n{'scenario':<14}{'wall, s':>10}{'commands':>10}{'peak rss, MB':>14}  top commands")
+    for r in results:
+        top = ", ".join(f"{k}={v}" for k, v in r.top_commands.items())
+        print(f"{r.scenario:<14}{r.wall:>10.2f}{r.commands:>10}{r.peak_rss_mb:>14.0f}  {r.error or top}")
+
+    if output:
+        output.write_text(json.dumps([asdict(r) for r in results], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local copy of genshindrop.io pages for offline benchmarks.
+
+Serves the fixtures from `bench/fixtures` with a stdlib HTTP
+server, pages are filled with generated cases, giveaways and
+inventory items so their amount can be set per scenario.
+"""
+import base64
+import threading
+import time
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+# 1x1 transparent png for all images
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+ITEM_NAMES = [
+    "Примогемы x60", "Кристалл сотворения x60", "Благословение полой луны",
+    "Мора x10000", "Опыт героя x5", "Чиби фигурка Паймон", "Скин для Эмбер",
+]
+
+def render(fixture: str, **values) -> str:
+    """Fill `{{key}}` placeholders of a fixture. """
+    text = (FIXTURES / fixture).read_text(encoding="utf-8")
+    for key, value in values.items():
+        text = text.replace("{{" + key + "}}", str(value))
+    return text
+
+class FixtureSite:
+    """Settings of the generated site, can be changed between scenarios. """
+    def __init__(self, cases: int = 12, giveaways: int = 5, inventory: int = 10, page_size: int = 24,
+                 latency: float = 0.0):
+        self.cases = cases
+        self.giveaways = giveaways
+        self.inventory = inventory
+        self.page_size = page_size
+        # Seconds before every html page is sent, like a remote site
+        self.latency = latency
+
+    @property
+    def last_page(self) -> int:
+        return max(1, -(-self.inventory // self.page_size))
+
+    def page(self, content: str) -> str:
+        return render("layout.html", gold=120, coins=35, content=content)
+
+    def index(self) -> str:
+        cases = [
+            render("index_case.html", slug=f"case-{i}", name=f"Кейс {i}", price=i % 3)
+            for i in range(self.cases)
+        ]
+        half = len(cases) // 2
+        return self.page(render(
+            "index.html",
+            genshin_cases="".join(cases[:half]),
+            hsr_cases="".join(cases[half:]),
+        ))
+
+    def case(self, slug: str) -> str:
+        index = int(slug.rsplit("-", 1)[-1]) if slug.rsplit("-", 1)[-1].isdigit() else 0
+        cards = "".join(
+            f'                <div class="box-page-loot-cards-card" data-item="{ITEM_NAMES[i % len(ITEM_NAMES)]}"></div>\n'
+            for i in range(8)
+        )
+        return self.page(render("case.html", name=f"Кейс {index}", price=index % 3, cards=cards))
+
+    def checkin(self) -> str:
+        return self.page(render("checkin.html", streak=7))
+
+    def give(self) -> str:
+        boxes = "".join(render("give_box.html", id=i + 1) for i in range(self.giveaways))
+        return self.page(render("give.html", giveaways=boxes))
+
+    def give_item(self, id: str) -> str:
+        number = int(id) if id.isdigit() else 0
+        return self.page(render(
+            "give_item.html",
+            id=number,
+            price=number % 2,
+            currency="coin" if number % 4 else "mor",
+        ))
+
+    def items(self, page: int) -> str:
+        start = (page - 1) * self.page_size
+        return "".join(
+            render(
+                "inventory_item.html",
+                index=i,
+                name=ITEM_NAMES[i % len(ITEM_NAMES)],
+                price=i % 20 + 1,
+                currency="coin" if i % 3 else "mor",
+            )
+            for i in range(start, min(start + self.page_size, self.inventory))
+        )
+
+    def profile(self) -> str:
+        more = ""
+        if self.last_page > 1:
+            more = f'        <button class="btn btn-more" data-page="2" data-last="{self.last_page}">Больше</button>'
+        return self.page(render(
+            "profile.html",
+            username="Bench",
+            id=100500,
+            rice=42,
+            secret="BENCH-SECRET",
+            items=self.items(1),
+            more_button=more,
+        ))
+
+class Handler(BaseHTTPRequestHandler):
+    site: FixtureSite
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = parse_qs(url.query)
+
+        match parts:
+            case []:
+                self._send(self.site.index())
+            case ["case", slug]:
+                self._send(self.site.case(slug))
+            case ["checkin"]:
+                self._send(self.site.checkin())
+            case ["give"]:
+                self._send(self.site.give())
+            case ["give", id]:
+                self._send(self.site.give_item(id))
+            case ["profile"]:
+                self._send(self.site.profile())
+            case ["profile", "inventory"]:
+                self._send(self.site.items(int(query.get("page", ["1"])[0])))
+            case ["static", *_] if url.path.endswith(".png"):
+                self._send(PNG, "image/png")
+            case ["static", name] if (FIXTURES / "static" / name).is_file():
+                types = {".js": "application/javascript", ".css": "text/css"}
+                path = FIXTURES / "static" / name
+                self._send(path.read_bytes(), types.get(path.suffix, "application/octet-stream"))
+            case _:
+                self.send_error(404)
+
+    def _send(self, body: str | bytes, content_type: str = "text/html; charset=utf-8"):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        if self.site.latency and content_type.startswith("text/html"):
+            time.sleep(self.site.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(site: FixtureSite, port: int = 0) -> ThreadingHTTPServer:
+    """Start the fixture server in a background thread. """
+    handler = type("SiteHandler", (Handler,), {"site": site})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve genshindrop fixtures")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--inventory", type=int, default=10, help="Number of inventory items.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before every page is sent.")
+    args = parser.parse_args()
+
+    server = serve(FixtureSite(inventory=args.inventory, latency=args.latency), args.port)
+    print(f"Serving fixtures on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
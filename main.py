@@ -1,4 +1,11 @@
-from src.core import run
+from src.config import CONFIG
 
 if __name__ == "__main__":
-    run()
+    # Config is loaded first, so --help and config errors
+    # show up before the browser code is imported
+    if CONFIG.daemon:
+        from src.daemon import run_daemon
+        run_daemon()
+    else:
+        from src.core import run
+        run()
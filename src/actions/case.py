@@ -1,16 +1,21 @@
 import random
+import time
 
 from selenium.webdriver.support.ui import WebDriverWait
 
-from src.logger import prinfo, prerror, prsuccess
+from src.logger import prinfo, prerror, prsuccess, prdebug
 from src.config import CONFIG
-from src.models import Case, CasesResult
-from src.common import random_sleep, get_swal, parse_num, click_el, \
-    handle_exceptions, wait_for, find, parse_attr, parse_img, \
-    parse_text, parse_currency
-from src.constants import BASE_URL, IGNORE_CASES, \
-    CaseSelectors, Condition, CurrencyType
-
+from src.metrics import timed
+from src.catalog import CATALOG
+from src.state import AccountState
+from src.models import Case, CasesResult, Query
+from src.common import pace, wait_settled, get_swal, parse_num, click_el, \
+    handle_exceptions, wait_for, find, extract, parse_currency
+from src.policy import get_policy
+from src.constants import BASE_URL, \
+    CaseSelectors, Condition, CurrencyType, CaseResultType, CaseStatus
+
+@timed()
 def get_cases(driver) -> list[Case]:
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     if driver.current_url != BASE_URL:
@@ -18,55 +23,73 @@ def get_cases(driver) -> list[Case]:
 
     # Get case elements
     wait_for(Condition.PRESENCE, wait, CaseSelectors.BOX)
+    policy = get_policy()
     res: list[Case] = []
 
-    # Get containers for each game
-    for container in find(driver, CaseSelectors.BOX, multiple=True):
-        # Get case info for every container
-        for case in find(container, CaseSelectors.CASE, multiple=True):
-            href = parse_attr(case, "href")
+    # Get case info for every container of each game
+    containers = extract(driver, {
+        "containers": Query(CaseSelectors.BOX, multiple=True, fields={
+            "cases": Query(CaseSelectors.CASE, multiple=True, fields={
+                "href": Query(attr="href"),
+                "image": Query(CaseSelectors.IMAGE, attr="src"),
+                "name": Query(CaseSelectors.NAME),
+                "price": Query(CaseSelectors.PRICE),
+            }),
+        }),
+    })["containers"]
+
+    for container in containers:
+        for case in container["cases"]:
+            href = case["href"] or ''
             if href == '' or href in [case.link for case in res]:
                 continue
-            image = parse_img(find(case, CaseSelectors.IMAGE))
-            name = parse_text(find(case, CaseSelectors.NAME))
+            image = case["image"]
+            name = case["name"]
+            price = parse_num(case["price"]) if parse_currency(case["price"]) == CurrencyType.COIN else None
 
             res.append(
                 Case(
                     link=href,
                     image=image,
                     name=name,
-                    is_ignored=href.split("/")[-1] in IGNORE_CASES,
-                    is_target=href.split("/")[-1].lower() == CONFIG.target_case.lower(),
+                    price=price,
+                    is_ignored=policy.is_ignored_case(href),
+                    is_target=policy.is_target_case(href),
                 )
             )
 
     return res
 
-def open_case(driver, case: Case) -> bool:
+@timed()
+def open_case(driver, case: Case) -> CaseStatus:
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     if driver.current_url != case.link:
         driver.get(case.link)
 
     wait_for(Condition.PRESENCE, wait, CaseSelectors.CARD_LIST)
-    random_sleep(3) # card animation
+    wait_settled(driver, CaseSelectors.CARD_LIST) # card animation
     
     # Extract case price
     price = None
-    reqs_el = find(driver, CaseSelectors.REQUIREMENTS)
-    if reqs_el:
+    reqs = extract(driver, {
+        "reqs": Query(CaseSelectors.REQUIREMENTS, fields={
+            "items": Query(CaseSelectors.REQUIREMENT, multiple=True),
+        }),
+    })["reqs"]
+    if reqs:
         # Try to parse the price from all requirements
-        for req_el in find(reqs_el, CaseSelectors.REQUIREMENT, multiple=True):
-            if parse_currency(req_el) == CurrencyType.COIN:
-                price = parse_num(req_el)
+        for req in reqs["items"]:
+            if parse_currency(req) == CurrencyType.COIN:
+                price = parse_num(req)
 
     # Decide if to open the case
     if case.is_target:
         prinfo("Target case detected. Opening regardless of price...")
     elif price is None:
         prinfo("No coin requirement found, opening the case anyway...")
-    elif price > CONFIG.case_price_threshold:
+    elif not get_policy().case_price_ok(price):
         prinfo(f"Case price ({price}) is higher than threshold ({CONFIG.case_price_threshold}), skipping...")
-        return False
+        return CaseStatus.SKIPPED
     else:
         prinfo(f"Case price: {price} coins. Opening...")
 
@@ -79,34 +102,70 @@ def open_case(driver, case: Case) -> bool:
         # Check if successful
         swal = get_swal(driver)
         if not swal.text:
-            return True
-
-    return False
+            return CaseStatus.OPENED
+        if CaseResultType.COOLDOWN_FAILURE in swal.text:
+            return CaseStatus.COOLDOWN
+        if CaseResultType.PAYMENTS_FAILURE in swal.text:
+            return CaseStatus.NO_PAYMENTS
+
+    return CaseStatus.FAILED
+
+def next_eligible(status: CaseStatus) -> float | None:
+    """
+    Time when a case can be tried again after the outcome. Opened
+    cases are not held back, the next daily run comes a bit less than
+    a day later and would skip them, the site reports a cooldown then.
+    """
+    match status:
+        case CaseStatus.COOLDOWN:
+            return time.time() + CONFIG.case_cooldown_hours * 3600
+        case CaseStatus.NO_PAYMENTS:
+            return time.time() + CONFIG.case_payments_recheck_hours * 3600
+    return None
 
 @handle_exceptions(default=CasesResult(success=False, reason="Failed to open cases"))
-def run_cases(driver) -> CasesResult:
+def run_cases(driver, state: AccountState | None = None) -> CasesResult:
     opened_cases = 0
-    ignored_cases = 0
-    available_cases = get_cases(driver)
-
-    for case in available_cases:
-        # Skip ignored cases, unless target
-        if case.is_target or not case.is_ignored:
-            prinfo(f"Opening case: {case.name if case.name != '' else case.link}...")
-            if open_case(driver, case):
-                prsuccess(f"Opened case: {case.name}")
-                opened_cases += 1
-            else:
-                prerror(f"Failed to open case: {case.name}")
-
-            # Cooldown after each case
-            random_sleep(7)
+    waiting_cases = 0
+    available_cases = CATALOG.get("cases", lambda: get_cases(driver))
+    eligible_at = state.section("cases") if state else {}
+
+    # Ignored cases and ones priced too high on the main page
+    # are left out at once, target cases are always opened
+    to_open = get_policy().cases_to_open(available_cases)
+    ignored_cases = sum(1 for c in available_cases if c.is_ignored and not c.is_target)
+    prdebug(f"{len(available_cases) - len(to_open) - ignored_cases} cases are priced above threshold")
+
+    for case in to_open:
+        # Skip cases that can't be opened yet
+        slug = case.link.split("/")[-1]
+        if eligible_at.get(slug, 0) > time.time():
+            prdebug(f"Case {case.name or slug} can't be opened yet, skipping...")
+            waiting_cases += 1
+            continue
+
+        prinfo(f"Opening case: {case.name if case.name != '' else case.link}...")
+        status = open_case(driver, case)
+        if status is CaseStatus.OPENED:
+            prsuccess(f"Opened case: {case.name}")
+            opened_cases += 1
+        elif status is not CaseStatus.SKIPPED:
+            prerror(f"Failed to open case: {case.name} ({status.value})")
+
+        at = next_eligible(status)
+        if at is not None:
+            eligible_at[slug] = at
         else:
-            ignored_cases += 1
+            eligible_at.pop(slug, None)
+
+        # Cooldown after each opened case page
+        if status is not CaseStatus.SKIPPED:
+            pace("case_cooldown")
 
     return CasesResult(
         success=True,
         available_cases=available_cases,
         opened_cases=opened_cases,
         ignored_cases=ignored_cases,
+        waiting_cases=waiting_cases,
     )
@@ -2,12 +2,12 @@ from selenium.webdriver.support.ui import WebDriverWait
 
 from src.logger import prsuccess, prwarn
 from src.common import get_swal, parse_num, click_el, handle_exceptions, \
-    wait_for, find, parse_currency
+    wait_for, extract, parse_currency
 from src.config import CONFIG
 from src.constants import CHECKIN_URL, CheckinSelectors, Condition
-from src.models import CheckinResult
+from src.models import CheckinResult, Query
 
-@handle_exceptions(default=CheckinResult(success=False, reason="Failed to check in"), retry=True)
+@handle_exceptions(default=CheckinResult(success=False, reason="Failed to check in"), retry="checkin")
 def run_daily_checkin(driver) -> CheckinResult:
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     if driver.current_url != CHECKIN_URL:
@@ -33,17 +33,27 @@ def run_daily_checkin(driver) -> CheckinResult:
         prwarn("No daily check-in button detected. Seems like you already checked in today")
 
     # Parse data
-    streak = parse_num(find(driver, CheckinSelectors.STREAK))
-    monthly_bonus = parse_num(find(driver, CheckinSelectors.MONTHLY_BONUS), is_percent=True)
-    payments_bonus = parse_num(find(driver, CheckinSelectors.PAYMENTS_BONUS), is_percent=True)
-    skipped_day = not bool(find(driver, CheckinSelectors.SKIP_AVAILABLE))
+    data = extract(driver, {
+        "streak": Query(CheckinSelectors.STREAK),
+        "monthly_bonus": Query(CheckinSelectors.MONTHLY_BONUS),
+        "payments_bonus": Query(CheckinSelectors.PAYMENTS_BONUS),
+        "skip_available": Query(CheckinSelectors.SKIP_AVAILABLE, exists=True),
+    })
+    streak = parse_num(data["streak"])
+    monthly_bonus = parse_num(data["monthly_bonus"], is_percent=True)
+    payments_bonus = parse_num(data["payments_bonus"], is_percent=True)
+    skipped_day = not data["skip_available"]
+    # No button on a page that loaded, not a page that failed to load
+    already_checked_in = button is None and data["streak"] is not None
 
     # Earned and currency type from swal
     earned = parse_num(title)
     currency_type = parse_currency(title)
 
     return CheckinResult(
-        success=checked_in,
+        # Already checked in is done for today, not a failure to retry
+        success=checked_in or already_checked_in,
+        already_checked_in=already_checked_in,
         streak=streak if streak else 0,
         monthly_bonus=monthly_bonus if monthly_bonus else 0.0,
         payments_bonus=payments_bonus if payments_bonus else 0.0,
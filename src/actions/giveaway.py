@@ -1,38 +1,83 @@
+import time
+
+from typing import Iterator
+
 from selenium.webdriver.support.ui import WebDriverWait
 
+from src.browser import open_tabs
 from src.config import CONFIG
-from src.models import GiveawayResult
-from src.logger import prsuccess, prwarn, prinfo
+from src.metrics import timed
+from src.catalog import CATALOG
+from src.state import AccountState
+from src.policy import get_policy
+from src.models import GiveawayResult, Query
+from src.logger import prsuccess, prwarn, prinfo, prdebug
 from src.constants import GIVEAWAY_URL, GiveawaySelectors, Condition, \
-    GiveawayResultType
-from src.common import random_sleep, get_swal, parse_num, \
-    handle_exceptions, click_el, wait_for, find, parse_attr, \
-    CurrencyType, parse_currency
+    GiveawayResultType, GiveawayStatus
+from src.common import pace, get_swal, parse_num, \
+    handle_exceptions, click_el, wait_for, extract, parse_currency, close_tabs, \
+    same_url, wait_loaded
 
-@handle_exceptions(default=GiveawayResult(success=False, reason="Failed to join giveaways"))
-def run_giveaway(driver) -> GiveawayResult:
-    """Checks out all giveaways on the giveaways main page. """
+@timed()
+def get_giveaways(driver) -> list[str]:
+    """Get links of all giveaways on the giveaways main page. """
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     if driver.current_url != GIVEAWAY_URL:
         driver.get(GIVEAWAY_URL)
 
     # Wait for at least one giveaway to load, then get all giveaways
     wait_for(Condition.VISIBLE, wait, GiveawaySelectors.GIVEAWAY)
-    giveaways = find(driver, GiveawaySelectors.GIVEAWAY, multiple=True)
-    links = []
-    for giveaway in giveaways:
-        links.append(
-            parse_attr(find(giveaway, GiveawaySelectors.LINK), "href")
-        )
+    giveaways = extract(driver, {
+        "giveaways": Query(GiveawaySelectors.GIVEAWAY, multiple=True, fields={
+            "link": Query(GiveawaySelectors.LINK, attr="href"),
+        }),
+    })["giveaways"]
+    return [giveaway["link"] or '' for giveaway in giveaways]
+
+def should_check(entry: dict | None) -> bool:
+    """Check if the giveaway decision might have changed since the last run. """
+    if entry is None:
+        return True
+
+    match entry["status"]:
+        case GiveawayStatus.JOINED:
+            return False
+        case GiveawayStatus.REJECTED_PRICE if entry.get("threshold") != CONFIG.giveaway_price_threshold:
+            return True
+        case GiveawayStatus.ALREADY_JOINED | GiveawayStatus.REJECTED_PRICE | GiveawayStatus.REJECTED_CURRENCY:
+            return time.time() - entry["checked_at"] > CONFIG.giveaway_recheck_hours * 3600
+    return True
+
+@handle_exceptions(default=GiveawayResult(success=False, reason="Failed to join giveaways"))
+def run_giveaway(driver, state: AccountState | None = None) -> GiveawayResult:
+    """Checks out all new giveaways on the giveaways main page. """
+    links = CATALOG.get("giveaways", lambda: get_giveaways(driver))
+    known = state.section("giveaways") if state else {}
+
+    # Forget giveaways that ended and are no longer listed
+    if links:
+        for link in set(known) - set(links):
+            del known[link]
+
+    to_check = []
+    for link in links:
+        if not should_check(known.get(link)):
+            prdebug(f"Skipping giveaway {link}, already {known[link]['status']}")
+            continue
+        to_check.append(link)
 
     # Join all giveaways
     joined = []
-    for link in links:
-        prinfo(f"Checking out giveaway: {link}")
-        random_sleep(1)
-        if join_giveaway(driver, link):
+    for link, status in check_giveaways(driver, to_check):
+        if status is not GiveawayStatus.FAILED:
+            known[link] = {
+                "status": status.value,
+                "checked_at": time.time(),
+                "threshold": CONFIG.giveaway_price_threshold,
+            }
+        if status is GiveawayStatus.JOINED:
             joined.append(link)
-            random_sleep(5)
+            pace("giveaway_join")
 
     return GiveawayResult(
         success=True,
@@ -40,36 +85,82 @@ def run_giveaway(driver) -> GiveawayResult:
         joined=joined
     )
 
-def join_giveaway(driver, href) -> bool:
+def check_giveaways(driver, links: list[str]) -> Iterator[tuple[str, GiveawayStatus]]:
+    """
+    Check out giveaways one by one, or with `giveaway_tabs` set
+    open that many at once in their own tabs and go through them
+    once they are loaded, so the pages load at the same time.
+    """
+    if CONFIG.giveaway_tabs < 2:
+        for link in links:
+            prinfo(f"Checking out giveaway: {link}")
+            pace("giveaway_check")
+            yield link, join_giveaway(driver, link)
+        return
+
+    origin = driver.current_window_handle
+    for i in range(0, len(links), CONFIG.giveaway_tabs):
+        batch = links[i:i + CONFIG.giveaway_tabs]
+        tabs = open_tabs(driver, batch)
+        try:
+            for link, tab in zip(batch, tabs):
+                driver.switch_to.window(tab)
+                prinfo(f"Checking out giveaway: {link}")
+                pace("giveaway_check")
+                yield link, join_giveaway(driver, link, loading=True)
+        finally:
+            close_tabs(driver, tabs, origin)
+
+@timed()
+def join_giveaway(driver, href, loading: bool = False) -> GiveawayStatus:
+    """
+    Join the giveaway if policy allows, with `loading` the page
+    is already loading in the current tab and isn't opened again.
+    """
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
-    if driver.current_url != href:
+    if loading:
+        # Pages load at the same time, so allow as long as a single request
+        url = wait_loaded(driver, max(CONFIG.wait_timeout, CONFIG.http_timeout))
+        if url is None:
+            prdebug(f"Giveaway {href} didn't load in its tab, opening it again")
+            driver.get(href)
+        elif not same_url(url, href):
+            prdebug(f"Giveaway {href} was redirected to {url}")
+    elif not same_url(driver.current_url, href):
         driver.get(href)
 
     # Wait for join button
     join_button = wait_for(Condition.CLICKABLE, wait, GiveawaySelectors.JOIN_BUTTON)
     if not join_button:
         prwarn("No giveaway join button detected. Seems like you already joined this giveaway")
-        return False
+        return GiveawayStatus.ALREADY_JOINED
 
     # Decide if to join the giveaway
     price_element = wait_for(Condition.PRESENCE, wait, GiveawaySelectors.PRICE)
     if price_element:
-        price = parse_num(price_element)
-        currency = parse_currency(parse_attr(find(price_element, GiveawaySelectors.CURRENCY)))
-        if currency in [CurrencyType.GOLD]:
-            prwarn(f"Giveaway currency is {currency.value}. Skipping.")
-            return False
-        if price and currency == CurrencyType.COIN:
-            if price > CONFIG.giveaway_price_threshold:
+        data = extract(price_element, {
+            "price": Query(),
+            "currency": Query(GiveawaySelectors.CURRENCY, attr="class"),
+        })
+        price = parse_num(data["price"])
+        currency = parse_currency(data["currency"])
+        match get_policy().giveaway_rejection(price, currency):
+            case GiveawayStatus.REJECTED_CURRENCY:
+                prwarn(f"Giveaway currency is {currency.value}. Skipping.")
+                return GiveawayStatus.REJECTED_CURRENCY
+            case GiveawayStatus.REJECTED_PRICE:
                 prwarn(f"Giveaway price ({price} {currency.value}) is above {CONFIG.giveaway_price_threshold}. Skipping.")
-                return False
+                return GiveawayStatus.REJECTED_PRICE
 
-    # Join giveaway
-    click_el(driver, join_button)
+    # Join giveaway, only a confirmed join is remembered,
+    # anything else is checked again next run
+    if not click_el(driver, join_button):
+        prwarn(f"Failed to click giveaway join button for {href}.")
+        return GiveawayStatus.FAILED
     swal = get_swal(driver)
-    if swal.title or swal.text:
-        prsuccess(f"Giveaway join button clicked for {href}.")
-        if swal.title == GiveawayResultType.FAILURE:
-            return False
+    if swal.title != GiveawayResultType.SUCCESS:
+        prwarn(f"Giveaway join for {href} wasn't confirmed: {swal.title or swal.text}")
+        return GiveawayStatus.FAILED
 
-    return True
+    prsuccess(f"Giveaway joined: {href}.")
+    return GiveawayStatus.JOINED
@@ -1,12 +1,13 @@
 from selenium.webdriver import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 
-from src.logger import prsuccess
+from src.logger import prsuccess, prerror
 from src.constants import LoginSelectors, CommonSelectors, Condition
 from src.config import CONFIG
 from src.constants import BASE_URL, PROFILE_URL
 from src.common import handle_exceptions, wait_for, click_el, \
-    switch_newtab, random_sleep, tab_exists, parse_text
+    switch_newtab, pace, wait_settled, tab_exists, parse_text
+from src.watchdog import out_of_time
 
 def get_secretcode(driver) -> str | None:
     """Get user secret code for verification in Telegram bot. """
@@ -14,7 +15,7 @@ def get_secretcode(driver) -> str | None:
         driver.get(PROFILE_URL)
 
     driver.execute_script('$("#MySecretCode").modal("show");')
-    random_sleep(2)
+    wait_settled(driver, LoginSelectors.SECRET_CODE_MODAL)
     return parse_text(
         wait_for(
             Condition.PRESENCE, 
@@ -28,13 +29,17 @@ def oauth_loop(driver, tab) -> bool:
     """Oauth window loop for Telegram login. """
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     while tab_exists(driver, tab):
+        if out_of_time():
+            prerror("Telegram login wasn't completed in time")
+            return False
+
         # Check for phone input
         phone_input = wait_for(
             Condition.CLICKABLE, wait, LoginSelectors.TG_PHONE_INPUT
         )
         if phone_input:
             for i in range(4):
-                random_sleep(0.3, 0.1)
+                pace("typing")
                 phone_input.send_keys(Keys.BACKSPACE)
             phone_input.send_keys(str(CONFIG.new_account), Keys.ENTER)
         
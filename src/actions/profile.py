@@ -1,93 +1,193 @@
+import time
+
+from collections import Counter
+from dataclasses import replace
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.ui import WebDriverWait
 
-from src.logger import prsuccess
+from src.logger import prsuccess, prdebug
 from src.config import CONFIG
-from src.models import Balance, InventoryItem, Profile
-from src.common import random_sleep, get_swal, parse_num, \
-    click_el, handle_exceptions, parse_img, parse_text, \
-    wait_for, find, parse_attr, parse_currency
-from src.constants import PROFILE_URL, IGNORE_ITEMS, StateSelectors, \
+from src.metrics import timed
+from src.models import Balance, InventoryItem, Profile, Query
+from src.state import AccountState
+from src.common import pace, get_swal, parse_num, \
+    click_el, handle_exceptions, parse_text, wait_for, find, \
+    extract, expand_and_extract, indexed, parse_currency
+from src.policy import get_policy
+from src.constants import PROFILE_URL, StateSelectors, \
     ProfileSelectors, InventorySelectors, Condition, CurrencyType
 
+@timed()
 def get_profile_balance(driver) -> Balance:
     """Get user's gold and coins. """
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     if driver.current_url != PROFILE_URL:
         driver.get(PROFILE_URL)
 
-    gold = parse_num(wait_for(Condition.PRESENCE, wait, StateSelectors.GOLD))
-    coins = parse_num(wait_for(Condition.PRESENCE, wait, StateSelectors.COINS))
+    wait_for(Condition.PRESENCE, wait, StateSelectors.GOLD)
+    data = extract(driver, {
+        "gold": Query(StateSelectors.GOLD),
+        "coins": Query(StateSelectors.COINS),
+    })
+    gold = parse_num(data["gold"])
+    coins = parse_num(data["coins"])
 
     return Balance(gold=gold or 0, coins=coins or 0)
 
+@timed()
 def sell_item(driver, i: InventoryItem, sell_button: WebElement | None) -> bool:
     """Helper for selling items from user's inventory. """
-    # Check if can sell item
-    can_sell = False
-    if CONFIG.sell_inventory and sell_button is not None:
-        # is item in ignored items list
-        if (not any(ignored.lower() in i.name.lower() for ignored in IGNORE_ITEMS) or CONFIG.sell_ignored is True):
-            # Check for gold items
-            match i.currency_type:
-                case CurrencyType.GOLD:
-                    if CONFIG.sell_gold:
-                        if i.price <= CONFIG.sell_gold_price_threshold:
-                            can_sell = True
-                case CurrencyType.COIN:
-                    can_sell = True
-    
-    # Sell item
-    if can_sell:
-        click_el(driver, sell_button)
-        swal = get_swal(driver)
-        if swal.confirm_button:
-            prsuccess(f"Successfully sold {i.name} for {i.price} {i.currency_type}")
-            random_sleep(1)
-            swal.click_confirm()
-        # Cooldown after selling
-        random_sleep(2, 1)
-    return can_sell
-
-def get_profile_inventory(driver) -> list[InventoryItem]:
-    """Get user's inventory items. """
+    if sell_button is None:
+        return False
+
+    click_el(driver, sell_button)
+    swal = get_swal(driver)
+    if swal.confirm_button:
+        prsuccess(f"Successfully sold {i.name} for {i.price} {i.currency_type}")
+        pace("sell_confirm")
+        swal.click_confirm()
+    # Cooldown after selling
+    pace("sell_cooldown")
+    return True
+
+# Identity of an inventory item, the site has no item ids
+# in the markup, so it's made from the sell link and item fields
+ITEM_KEY = {
+    "id": Query(InventorySelectors.SELL_BUTTON, attr="data-id"),
+    "link": Query(InventorySelectors.SELL_BUTTON, attr="href"),
+    "name": Query(InventorySelectors.NAME),
+    "image": Query(InventorySelectors.IMAGE, attr="src"),
+    "price": Query(InventorySelectors.PRICE),
+}
+
+def inventory_snapshot(state: AccountState | None) -> list[dict]:
+    """Get saved inventory of the account if it can be used. """
+    if state is None or not CONFIG.incremental_inventory:
+        return []
+
+    inventory = state.section("inventory")
+    age = time.time() - inventory.get("scanned_at", 0)
+    if age > CONFIG.inventory_full_scan_hours * 3600:
+        prdebug("Inventory snapshot is too old, reading the whole inventory")
+        return []
+
+    return inventory.get("items", [])
+
+def to_snapshot(items: list[InventoryItem]) -> list[dict]:
+    """Unsold inventory items with known keys, newest first. """
+    return [
+        {
+            "key": i.key,
+            "name": i.name,
+            "image": i.image,
+            "price": i.price,
+            "currency_type": i.currency_type.value,
+        }
+        for i in items if not i.sold and i.key is not None
+    ]
+
+def save_inventory_snapshot(state: AccountState | None, items: list[InventoryItem]):
+    """Save unsold inventory items of the account. """
+    if state is None or not CONFIG.incremental_inventory:
+        return
+
+    inventory = state.section("inventory")
+    inventory["scanned_at"] = time.time()
+    inventory["items"] = to_snapshot(items)
+
+@timed()
+def get_profile_inventory(
+    driver,
+    state: AccountState | None = None,
+    known: list[InventoryItem] | None = None,
+) -> list[InventoryItem]:
+    """
+    Get user's inventory items, with `known` items or a snapshot from
+    the previous run only items added since then are loaded and sold.
+    """
     res = []
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     if driver.current_url != PROFILE_URL:
         driver.get(PROFILE_URL)
 
     wait_for(Condition.VISIBLE, wait, InventorySelectors.ITEM_BOX)
-    # Load all items
-    while True:
-        load_more = wait_for(Condition.VISIBLE, wait, InventorySelectors.LOAD_MORE_BUTTON)
-        if load_more:
-            click_el(driver, load_more)
-            random_sleep(1)
+
+    # Load items and get their info at once
+    snapshot = to_snapshot(known) if known is not None else inventory_snapshot(state)
+    items = expand_and_extract(
+        driver,
+        InventorySelectors.LOAD_MORE_BUTTON,
+        Query(InventorySelectors.ITEM_BOX, fields={
+            "name": Query(InventorySelectors.NAME),
+            "image": Query(InventorySelectors.IMAGE, attr="src"),
+            "price": Query(InventorySelectors.PRICE),
+            "currency": Query(InventorySelectors.CURRENCY_TYPE, attr="class"),
+            "sellable": Query(InventorySelectors.SELL_BUTTON, exists=True),
+        }),
+        key=ITEM_KEY if CONFIG.incremental_inventory or CONFIG.delta_profile else None,
+        known=[i["key"] for i in snapshot],
+    )
+    if items is None:
+        raise Exception("Failed to load inventory")
+
+    # Older items weren't sold last time, so they won't be now
+    old = []
+    if snapshot:
+        if any(not item["_new"] for item in items):
+            # Identical items share a key, so keep as many old copies of
+            # each key as the snapshot has more than were loaded again,
+            # new drops with the same key don't stand in for old copies
+            loaded = Counter(item["_key"] for item in items if not item["_new"])
+            for i in snapshot:
+                if loaded[i["key"]] > 0:
+                    loaded[i["key"]] -= 1
+                else:
+                    old.append(i)
+            prdebug(f"{sum(1 for item in items if item['_new'])} new inventory items")
         else:
-            break
+            prdebug("Inventory snapshot doesn't match, read the whole inventory")
 
-    for item in find(driver, InventorySelectors.ITEM_BOX, multiple=True):
-        # Get item info
-        name = parse_text(find(item, InventorySelectors.NAME))
-        if name is None:
+    # Only new items with a sell button can be sold
+    candidates: list[tuple[int, InventoryItem]] = []
+    for index, item in enumerate(items):
+        if item["name"] is None:
             continue
-        image = parse_img(find(item, InventorySelectors.IMAGE))
-        price = parse_num(find(item, InventorySelectors.PRICE))
-        currency_type = parse_currency(
-            parse_attr(find(item, InventorySelectors.CURRENCY_TYPE)))
-        sell_button = find(item, InventorySelectors.SELL_BUTTON)
         
         item_data = InventoryItem(
-            name=name,
-            image=image,
-            price=price,
-            currency_type=currency_type)
-        item_data.sold = sell_item(driver, item_data, sell_button)
+            name=item["name"],
+            image=item["image"],
+            price=parse_num(item["price"]),
+            currency_type=parse_currency(item["currency"]),
+            key=item.get("_key"))
+        if item["sellable"] and item.get("_new", True):
+            candidates.append((index, item_data))
         res.append(item_data)
+
+    # Decide for all items before selling any
+    decisions = get_policy().sell_decisions([i for _, i in candidates])
+    to_sell = [c for c, sell in zip(candidates, decisions) if sell]
+
+    res += [
+        InventoryItem(
+            name=i["name"],
+            image=i["image"],
+            price=i["price"],
+            currency_type=CurrencyType(i["currency_type"]),
+            key=i["key"])
+        for i in old
+    ]
+
+    # Sell items, only touching the ones to be sold
+    for index, item_data in to_sell:
+        box = find(driver, indexed(InventorySelectors.ITEM_BOX, index))
+        sell_button = find(box, InventorySelectors.SELL_BUTTON) if box else None
+        item_data.sold = sell_item(driver, item_data, sell_button)
+
+    save_inventory_snapshot(state, res)
     return res
 
 @handle_exceptions()
-def run_profile(driver, initial: bool = False) -> Profile | None:
+def run_profile(driver, initial: bool = False, state: AccountState | None = None) -> Profile | None:
     """Get user's profile information. """
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
     if driver.current_url != PROFILE_URL:
@@ -96,23 +196,28 @@ def run_profile(driver, initial: bool = False) -> Profile | None:
     box = wait_for(Condition.VISIBLE, wait, ProfileSelectors.PANEL_BOX)
     if box:
         # Get profile data
-        id_el = find(box, ProfileSelectors.ID)
-        if id_el is None:
+        data = extract(box, {
+            "id": Query(ProfileSelectors.ID),
+            "avatar_url": Query(ProfileSelectors.AVATAR, attr="src"),
+            "username": Query(ProfileSelectors.USERNAME),
+            "rice": Query(ProfileSelectors.RICE),
+            "verified": Query(ProfileSelectors.IS_VERIFIED, attr="class"),
+        })
+        if data["id"] is None:
             raise Exception("ID not found")
-        id = id_el.text.split("ID")[-1].strip()
-        avatar_url = parse_img(find(box, ProfileSelectors.AVATAR))
-        username = parse_text(find(box, ProfileSelectors.USERNAME))
-        rice = parse_num(find(box, ProfileSelectors.RICE))
-        verified_el = find(box, ProfileSelectors.IS_VERIFIED)
-        is_verified = "true" in parse_attr(verified_el) if verified_el else None
+        id = data["id"].split("ID")[-1].strip()
+        avatar_url = data["avatar_url"]
+        username = parse_text(data["username"])
+        rice = parse_num(data["rice"])
+        is_verified = "true" in str(data["verified"]) if data["verified"] is not None else None
 
         # Get other data, balance first if initial,
         # otherwise inventory first
         if initial:
             balance = get_profile_balance(driver)
-            inventory = get_profile_inventory(driver)
+            inventory = get_profile_inventory(driver, state)
         else:
-            inventory = get_profile_inventory(driver)
+            inventory = get_profile_inventory(driver, state)
             balance = get_profile_balance(driver)
 
         return Profile(
@@ -124,3 +229,37 @@ def run_profile(driver, initial: bool = False) -> Profile | None:
             balance=balance,
             inventory=inventory,
         )
+
+@handle_exceptions()
+def refresh_profile(driver, initial: Profile, state: AccountState | None = None) -> Profile | None:
+    """
+    Get user's profile after the actions from the initial one,
+    only reading balance and inventory items added since then.
+    """
+    wait = WebDriverWait(driver, CONFIG.wait_timeout)
+    if driver.current_url != PROFILE_URL:
+        driver.get(PROFILE_URL)
+
+    # Page didn't load or the session was logged out
+    if not wait_for(Condition.VISIBLE, wait, ProfileSelectors.PANEL_BOX):
+        return None
+
+    # Inventory first, selling changes the balance
+    inventory = get_profile_inventory(driver, state, known=initial.inventory)
+    data = extract(driver, {
+        "id": Query(ProfileSelectors.ID),
+        "gold": Query(StateSelectors.GOLD),
+        "coins": Query(StateSelectors.COINS),
+        "rice": Query(ProfileSelectors.RICE),
+    })
+    if data["id"] is None:
+        raise Exception("ID not found")
+    if data["gold"] is None or data["coins"] is None:
+        raise Exception("Balance not found")
+
+    return replace(
+        initial,
+        rice=parse_num(data["rice"]),
+        balance=Balance(gold=parse_num(data["gold"]) or 0, coins=parse_num(data["coins"]) or 0),
+        inventory=inventory,
+    )
@@ -1,15 +1,28 @@
-import pickle
 import os
+import queue
+import signal
+import threading
 
+from contextlib import contextmanager
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
 
 from src.config import CONFIG
 from src.common import is_docker
+from src.constants import BASE_URL, TELEGRAM_OAUTH_URL, USER_AGENT, \
+    LEAN_RESOURCE_PATTERNS
+from src.logger import prdebug, prerror
+from src.metrics import span
+from src.remote import Endpoint, RemoteEndpoints
+from src.sessions import load_session, save_session
 
-def create_driver():
+def create_driver(endpoint: Endpoint | None = None):
+    """Start a local browser, or on the remote WebDriver endpoint if given. """
     options = webdriver.ChromeOptions()
-    options.binary_location = CONFIG.chromium_path
+    binary = endpoint.chromium_path if endpoint else CONFIG.chromium_path
+    if binary:
+        options.binary_location = binary
     if (CONFIG.headless if not CONFIG.new_account else False):
         options.add_argument("--headless=new")
         options.add_argument("--disable-gpu")
@@ -23,14 +36,27 @@ def create_driver():
     options.add_experimental_option("useAutomationExtension", False)
 
     # User agent
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/145.0.0.0 Safari/537.36"
-    )
+    options.add_argument(f"user-agent={USER_AGENT}")
     options.add_argument("--window-size=1920,1080")
 
-    service = Service(executable_path=CONFIG.chromedriver_path)
-    driver = webdriver.Chrome(service=service, options=options)
+    if endpoint:
+        # Chromium connection, so CDP commands work on the remote browser too
+        connection = ChromiumRemoteConnection(endpoint.url, vendor_prefix="goog", browser_name="chrome")
+        driver = webdriver.Remote(command_executor=connection, options=options)
+    else:
+        service = Service(executable_path=CONFIG.chromedriver_path)
+        driver = webdriver.Chrome(service=service, options=options)
 
+    try:
+        setup_tab(driver)
+    except Exception:
+        driver.quit()
+        raise
+
+    return driver
+
+def setup_tab(driver):
+    """Prepare the current tab, needs to run for every new tab. """
     # Remove navigator.webdriver
     driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
         "source": """
@@ -40,7 +66,253 @@ def create_driver():
         """
     })
 
-    return driver
+    # Block resources that are never read in lean mode
+    if CONFIG.lean:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": lean_blocklist()})
+
+def open_tabs(driver, links: list[str]) -> list[str]:
+    """
+    Open every link in its own new tab without waiting for it
+    to load, so the pages load at the same time. Every tab is
+    set up before navigating, so lean mode applies to it too.
+    Returns handles of the tabs, the current tab stays active.
+    """
+    origin = driver.current_window_handle
+    tabs = []
+    try:
+        for link in links:
+            driver.switch_to.new_window("tab")
+            setup_tab(driver)
+            # Navigate after the script returns, so the driver doesn't wait for the page
+            driver.execute_script("const url = arguments[0]; setTimeout(() => { location.href = url; }, 0);", link)
+            tabs.append(driver.current_window_handle)
+    finally:
+        driver.switch_to.window(origin)
+    return tabs
+
+def lean_blocklist() -> list[str]:
+    """Get URL patterns blocked in lean mode. """
+    urls = [
+        pattern
+        for resource in CONFIG.blocked_resources
+        for pattern in LEAN_RESOURCE_PATTERNS[resource]
+    ]
+    return urls + CONFIG.blocked_urls
+
+def reset_driver(driver):
+    """
+    Remove all state left by the previous account,
+    so the browser can be safely reused.
+    """
+    # Fresh tab drops sessionStorage, close the rest
+    old_tabs = driver.window_handles
+    driver.switch_to.new_window("tab")
+    new_tab = driver.current_window_handle
+    for tab in old_tabs:
+        driver.switch_to.window(tab)
+        driver.close()
+    driver.switch_to.window(new_tab)
+    setup_tab(driver)
+
+    # Cookies, cache and storage of the visited origins
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    for origin in [BASE_URL, TELEGRAM_OAUTH_URL]:
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
+            "origin": origin,
+            "storageTypes": "all",
+        })
+
+def process_tree(pid: int) -> list[int]:
+    """Get pid and pids of all its descendants, Linux only. """
+    pids = [pid]
+    for p in pids:
+        try:
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except FileNotFoundError:
+            # Process exited meanwhile
+            if p == pid:
+                raise
+    return pids
+
+def process_tree_memory_mb(pid: int) -> float:
+    """Get resident memory used by process and all its descendants. """
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1])
+        except OSError:
+            # Process exited meanwhile
+            continue
+    return total * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+def driver_memory_mb(driver) -> float | None:
+    """
+    Get resident memory used by chromedriver and all browser
+    processes it started, None if it can't be measured.
+    """
+    try:
+        return process_tree_memory_mb(driver.service.process.pid)
+    except (OSError, AttributeError, ValueError):
+        return None
+
+def kill_driver(driver):
+    """
+    Force kill chromedriver and all browser processes it started,
+    pending commands of the driver fail right away.
+    """
+    try:
+        process = driver.service.process
+    except AttributeError:
+        # Remote browser, ending its session is all that can be done
+        try:
+            driver.quit()
+        except Exception as e:
+            prdebug(f"Failed to quit remote browser: {e}")
+        return
+    # Already quit, its pid may belong to another process by now
+    if process is None or process.poll() is not None:
+        return
+
+    try:
+        pids = process_tree(process.pid)
+    except OSError:
+        pids = [process.pid]
+
+    # Children first, so none are left orphaned
+    for pid in reversed(pids):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (OSError, AttributeError):
+            continue
+    try:
+        # Where the tree can't be read, at least chromedriver is killed
+        process.kill()
+        process.wait(timeout=5)
+    except Exception as e:
+        prdebug(f"Failed to wait for killed chromedriver: {e}")
+
+class DriverPool:
+    """
+    Pool of warm browsers that are reused across accounts.
+    Browsers are reset between accounts and recycled
+    after too many uses or if they use too much memory.
+    With remote endpoints in config, browsers are started
+    on them as their capacity allows instead of locally.
+    """
+    def __init__(self):
+        self._idle = queue.LifoQueue()
+        self._uses: dict[int, int] = {}
+        self._endpoints: dict[int, Endpoint] = {}
+        self._lock = threading.Lock()
+        self._remote = RemoteEndpoints(CONFIG.remote_endpoints) if CONFIG.remote_endpoints else None
+
+    def acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            if self._remote is None:
+                with span("create_driver"):
+                    return create_driver()
+
+            driver = self._acquire_remote()
+            if driver is not None:
+                return driver
+            # All slots are taken, wait for one or for an idle browser
+            self._remote.wait()
+
+    def _acquire_remote(self):
+        """Start a browser on a free remote endpoint, None if all are busy. """
+        while True:
+            try:
+                endpoint = self._remote.reserve()
+            except Exception:
+                if not CONFIG.remote_local_fallback:
+                    raise
+                prdebug("No healthy remote WebDriver endpoints, starting a local browser")
+                with span("create_driver"):
+                    return create_driver()
+            if endpoint is None:
+                return None
+
+            try:
+                with span("create_driver"):
+                    driver = create_driver(endpoint)
+            except Exception as e:
+                # Fail over to the next endpoint
+                prerror(f"Failed to start browser on {endpoint.url}: {e}")
+                self._remote.release(endpoint, failed=True)
+                continue
+
+            with self._lock:
+                self._endpoints[id(driver)] = endpoint
+            return driver
+
+    def release(self, driver, broken: bool = False):
+        with self._lock:
+            uses = self._uses.pop(id(driver), 0) + 1
+
+        if not broken and self._can_reuse(driver, uses):
+            try:
+                with span("reset_driver"):
+                    reset_driver(driver)
+                with self._lock:
+                    self._uses[id(driver)] = uses
+                self._idle.put(driver)
+                return
+            except Exception as e:
+                prdebug(f"Failed to reset browser: {e}")
+
+        self._quit(driver)
+
+    @contextmanager
+    def driver(self):
+        """Borrow a browser from the pool for one account. """
+        driver = self.acquire()
+        broken = True
+        try:
+            yield driver
+            broken = False
+        finally:
+            self.release(driver, broken=broken)
+
+    def close(self):
+        """Quit all idle browsers. """
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def _can_reuse(self, driver, uses: int) -> bool:
+        if not CONFIG.reuse_browser:
+            return False
+        if CONFIG.browser_max_uses and uses >= CONFIG.browser_max_uses:
+            prdebug(f"Recycling browser after {uses} uses")
+            return False
+        memory = driver_memory_mb(driver)
+        if CONFIG.browser_max_memory_mb and memory and memory > CONFIG.browser_max_memory_mb:
+            prdebug(f"Recycling browser using {memory:.0f} MB")
+            return False
+        return True
+
+    def _quit(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+            endpoint = self._endpoints.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            prdebug(f"Failed to quit browser: {e}")
+        if endpoint is not None:
+            self._remote.release(endpoint)
 
 def load_cookies(driver, cookie_file) -> tuple[bool, str]:
     """
@@ -51,16 +323,22 @@ def load_cookies(driver, cookie_file) -> tuple[bool, str]:
     Returns:
         tuple[bool, str]: (success, error)
     """
-    if os.path.exists(cookie_file):
-        try:
-            cookies = pickle.load(open(cookie_file, "rb"))
-            for cookie in cookies:
-                if 'sameSite' in cookie:
-                    cookie['sameSite'] = cookie['sameSite'].capitalize()
-                driver.add_cookie(cookie)
-            return True, ""
-        except Exception as e:
-            return False, f"Failed to load cookies: {e}"
-    return False, "Cookie file not found."
+    try:
+        cookies = load_session(cookie_file)
+    except FileNotFoundError:
+        return False, "Cookie file not found."
+    except Exception as e:
+        return False, f"Failed to load cookies: {e}"
+
+    try:
+        for cookie in cookies:
+            if 'sameSite' in cookie:
+                cookie['sameSite'] = cookie['sameSite'].capitalize()
+            driver.add_cookie(cookie)
+        return True, ""
+    except Exception as e:
+        return False, f"Failed to load cookies: {e}"
 
-def save_cookies(driver, cookie_file): pickle.dump(driver.get_cookies(), open(cookie_file, "wb"))
+def save_cookies(driver, cookie_file):
+    if not save_session(cookie_file, driver.get_cookies()):
+        prdebug(f"Cookies of {cookie_file} didn't change")
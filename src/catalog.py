@@ -0,0 +1,60 @@
+import threading
+import time
+
+from typing import Callable, TypeVar
+
+from src.config import CONFIG
+from src.logger import prdebug
+
+T = TypeVar("T")
+
+class Catalog:
+    """
+    Case and giveaway lists are the same for every account,
+    so they are scraped by the first account and shared with
+    the rest until they expire. Safe to use from many workers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._entries: dict[str, tuple[float, list]] = {}
+
+    def get(self, key: str, load: Callable[[], list[T]]) -> list[T]:
+        """
+        Get cached list or load it, while one worker loads
+        the others wait for its result instead of loading too.
+        """
+        if CONFIG.catalog_ttl <= 0:
+            return load()
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < CONFIG.catalog_ttl:
+                prdebug(f"Using cached {key} ({len(entry[1])})")
+                return list(entry[1])
+
+            value = load()
+            # Empty list is likely a failed scrape, try again next time
+            if value:
+                self._entries[key] = (time.monotonic(), list(value))
+            return value
+
+    def peek(self, key: str) -> list | None:
+        """Get cached list without loading it, None if expired. """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[0] < CONFIG.catalog_ttl:
+            return list(entry[1])
+        return None
+
+    def invalidate(self, key: str | None = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+CATALOG = Catalog()
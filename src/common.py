@@ -1,10 +1,11 @@
 import traceback
 import time
 import random
-import re
 import functools
+import dataclasses
 
 from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.common.by import By
 from difflib import SequenceMatcher
 from pathlib import Path
 from selenium.webdriver.remote.webelement import WebElement
@@ -20,11 +21,13 @@ from selenium.common.exceptions import (
     TimeoutException,
 )
 
-from src.constants import SwalSelectors, Condition, SelEnum, \
-    CurrencyType
+from src.constants import SwalSelectors, Condition, SelEnum
 from src.logger import prerror, prdebug
-from src.models import Swal
+from src.models import Swal, Query, Result
 from src.config import CONFIG
+from src.watchdog import time_left
+from src.metrics import RetryStats, retry_stats, record_retry
+from src.parsing import parse_text, parse_num, parse_currency
 
 def wait_for(c, wait: WebDriverWait, sel: SelEnum) -> WebElement | None:
     """
@@ -65,6 +68,265 @@ def find(driver: WebDriver | WebElement, sel: SelEnum | tuple[str, str], *, mult
     
     return [] if multiple else None
 
+# Shared helpers for resolving queries in page context
+QUERY_JS = """
+function findAll(ctx, by, val) {
+    if (by === null) return [ctx];
+    switch (by) {
+        case "xpath": {
+            const snap = document.evaluate(val, ctx, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            return Array.from({length: snap.snapshotLength}, (_, i) => snap.snapshotItem(i));
+        }
+        case "class name": return Array.from(ctx.querySelectorAll("." + CSS.escape(val)));
+        case "id": return Array.from(ctx.querySelectorAll("#" + CSS.escape(val)));
+        case "name": return Array.from(ctx.querySelectorAll(`[name="${CSS.escape(val)}"]`));
+        case "tag name": return Array.from(ctx.querySelectorAll(val));
+        default: return Array.from(ctx.querySelectorAll(val));
+    }
+}
+
+function value(el, q) {
+    if (q.exists) return true;
+    if (q.fields) return resolve(el, q.fields);
+    if (q.attr) {
+        // Same as selenium, resolved urls for href and src
+        if ((q.attr === "href" || q.attr === "src") && typeof el[q.attr] === "string") return el[q.attr];
+        return el.getAttribute(q.attr);
+    }
+    return (el.innerText ?? el.textContent ?? "").trim();
+}
+
+function resolve(ctx, queries) {
+    const res = {};
+    for (const [name, q] of Object.entries(queries)) {
+        const els = findAll(ctx, q.by, q.val);
+        if (q.multiple) res[name] = els.map(el => value(el, q));
+        else if (els.length) res[name] = value(els[0], q);
+        else res[name] = q.exists ? false : null;
+    }
+    return res;
+}
+"""
+
+EXTRACT_SCRIPT = QUERY_JS + """
+const [root, queries] = arguments;
+return resolve(root || document, queries);
+"""
+
+EXPAND_SCRIPT = QUERY_JS + """
+const [button, item, stop, timeout, delay, jitter, budget, done] = arguments;
+const started = Date.now();
+const sleep = ms => new Promise(r => setTimeout(r, ms));
+const count = () => findAll(document, item.by, item.val).length;
+const visible = el => el && el.getClientRects().length > 0 && getComputedStyle(el).visibility !== "hidden";
+const getButton = () => findAll(document, button.by, button.val).find(visible);
+const keys = () => findAll(document, item.by, item.val).map(el => JSON.stringify(resolve(el, stop.key)));
+
+// Number of new items before the already known ones,
+// null if loaded items don't reach the known ones yet
+function countNew(loaded) {
+    const need = Math.min(stop.confirm, stop.keys.length);
+    if (!need) return null;
+    for (let n = 0; n + need <= loaded.length; n++) {
+        let j = 0;
+        while (n + j < loaded.length && j < stop.keys.length && loaded[n + j] === stop.keys[j]) j++;
+        if (j >= need && (n + j === loaded.length || j === stop.keys.length)) return n;
+    }
+    return null;
+}
+
+async function expand() {
+    let clicks = 0;
+    while (Date.now() - started < budget) {
+        // Stop once reached the known items
+        if (stop && countNew(keys()) !== null) return {done: true, clicks};
+
+        // Button may appear a bit after new items were rendered
+        let btn = getButton();
+        for (let i = 0; !btn && i < 5; i++) {
+            await sleep(100);
+            btn = getButton();
+        }
+        if (!btn) return {done: true, clicks};
+
+        const before = count();
+        btn.click();
+        clicks++;
+
+        // Wait for the next page to be rendered
+        const clicked = Date.now();
+        while (count() <= before && Date.now() - clicked < timeout) await sleep(50);
+        if (count() <= before) return {done: true, clicks};
+
+        await sleep(delay + (Math.random() * 2 - 1) * jitter);
+    }
+    return {done: false, clicks};
+}
+
+expand().then(res => {
+    if (res.done) {
+        // Tag elements, so they can be found again by index
+        findAll(document, item.by, item.val).forEach((el, i) => el.dataset.adIndex = i);
+        res.items = resolve(document, {items: Object.assign({}, item, {multiple: true})}).items;
+        if (stop) {
+            const loaded = keys();
+            const n = countNew(loaded) ?? loaded.length;
+            res.items.forEach((it, i) => Object.assign(it, {_key: loaded[i], _new: i < n}));
+        }
+    }
+    done(res);
+}).catch(e => done({done: true, clicks: 0, error: String(e)}));
+"""
+
+def extract(root: WebDriver | WebElement, queries: dict[str, Query]) -> dict:
+    """
+    Extract all queried values from the page in one round trip.
+    Missing elements resolve to None, or empty list if multiple.
+    """
+    driver = root.parent if isinstance(root, WebElement) else root
+    try:
+        return driver.execute_script(
+            EXTRACT_SCRIPT,
+            root if isinstance(root, WebElement) else None,
+            {name: q.to_dict() for name, q in queries.items()},
+        )
+    except WebDriverException as e:
+        prerror(f"Driver error while extracting {', '.join(queries)}: {e}")
+
+    return {
+        name: [] if q.multiple else (False if q.exists else None)
+        for name, q in queries.items()
+    }
+
+SETTLED_SCRIPT = QUERY_JS + """
+const [sel] = arguments;
+const el = findAll(document, sel.by, sel.val)[0];
+if (!el || !el.getClientRects().length) return false;
+
+// Ignore endless animations like spinners
+return el.getAnimations({subtree: true}).every(a =>
+    a.playState !== "running" || a.effect?.getComputedTiming().endTime === Infinity
+);
+"""
+
+def wait_settled(driver, sel: SelEnum, timeout: float | None = None) -> bool:
+    """
+    Wait until the element is rendered and all its
+    animations and transitions have finished.
+    """
+    wait = WebDriverWait(
+        driver,
+        CONFIG.wait_timeout if timeout is None else timeout,
+        poll_frequency=CONFIG.poll_interval,
+    )
+    try:
+        return wait.until(lambda d: d.execute_script(SETTLED_SCRIPT, {"by": sel.by, "val": sel.val}))
+    except TimeoutException:
+        prdebug(f"Timeout while waiting for {sel} to settle")
+    except WebDriverException as e:
+        prerror(f"Driver error while waiting for {sel} to settle: {e}")
+
+    return False
+
+def same_url(a: str, b: str) -> bool:
+    """Compare urls ignoring a trailing slash. """
+    return a.rstrip("/") == b.rstrip("/")
+
+def wait_loaded(driver, timeout: float | None = None) -> str | None:
+    """
+    Wait until navigation started in the current tab has committed
+    and its page has loaded, returns url of the page or None on timeout.
+    """
+    wait = WebDriverWait(
+        driver,
+        CONFIG.wait_timeout if timeout is None else timeout,
+        poll_frequency=CONFIG.poll_interval,
+    )
+    try:
+        return wait.until(lambda d: d.execute_script(
+            'return document.readyState === "complete" && location.href !== "about:blank" && location.href;'
+        ))
+    except TimeoutException:
+        prdebug("Timeout while waiting for the page to load")
+    except WebDriverException as e:
+        prerror(f"Driver error while waiting for the page to load: {e}")
+
+    return None
+
+def expand_and_extract(
+    driver,
+    button: SelEnum,
+    item: Query,
+    key: dict[str, Query] | None = None,
+    known: list[str] | None = None,
+    confirm: int = 5,
+) -> list | None:
+    """
+    Keep clicking a "load more" button in page context until
+    it is gone, then extract all items in the same round trip.
+    Found items are tagged with `data-ad-index` attribute.
+
+    With `key` every item gets its identity in `_key`, if `known`
+    keys (newest first) are given, loading stops once `confirm` of
+    them are reached, and only items before them have `_new` set.
+    Returns None on driver or script errors.
+    """
+    stop = None
+    if key:
+        stop = {
+            "key": {name: q.to_dict() for name, q in key.items()},
+            "keys": known or [],
+            "confirm": confirm,
+        }
+
+    # Stay within the driver's script timeout, a call can take one more
+    # round of waiting for the button, the next page and pacing after
+    # the budget, and time to extract the items, the rest continues in next call
+    wait_ms = CONFIG.wait_timeout * 1000
+    delay_ms, jitter_ms = (v * 1000 for v in CONFIG.pacing["load_more"])
+    try:
+        script_ms = driver.timeouts.script * 1000
+    except (WebDriverException, TypeError):
+        script_ms = 30_000
+    max_budget = max(1000, min(20_000, script_ms - (500 + wait_ms + delay_ms + jitter_ms + 2000)))
+
+    while True:
+        # Out of time fails the read, a partial list would
+        # look like items were sold or removed
+        left = time_left()
+        if left is not None and left <= 0:
+            prerror(f"Out of time while expanding {button}")
+            return None
+        budget = max_budget if left is None else min(max_budget, left * 1000)
+
+        try:
+            res = driver.execute_async_script(
+                EXPAND_SCRIPT,
+                {"by": button.by, "val": button.val},
+                item.to_dict(),
+                stop,
+                wait_ms,
+                delay_ms,
+                jitter_ms,
+                budget,
+            )
+        except WebDriverException as e:
+            prerror(f"Driver error while expanding {button}: {e}")
+            return None
+
+        prdebug(f"Clicked {button} {res['clicks']} times")
+        if res.get("error"):
+            prerror(f"Script error while expanding {button}: {res['error']}")
+            return None
+        if res["done"]:
+            return res.get("items", [])
+
+def indexed(sel: SelEnum, index: int) -> tuple[str, str]:
+    """Selector of an element tagged by `expand_and_extract`. """
+    if sel.by != By.CSS_SELECTOR:
+        raise ValueError(f"Only css selectors can be indexed: {sel}")
+    return (By.CSS_SELECTOR, f'{sel.val}[data-ad-index="{index}"]')
+
 def switch_newtab(driver) -> str:
     """Switch the driver to a new tab. """
     driver.switch_to.window(driver.window_handles[-1])
@@ -76,76 +338,112 @@ def tab_exists(driver, handle: str) -> bool:
     except Exception:
         return False
 
+def close_tabs(driver, tabs: list[str], back_to: str):
+    """Close the tabs if still open and switch to another tab. """
+    for tab in tabs:
+        try:
+            driver.switch_to.window(tab)
+            driver.close()
+        except WebDriverException as e:
+            prdebug(f"Failed to close tab {tab}: {e}")
+    driver.switch_to.window(back_to)
+
 def close_all_tabs(driver):
     """Close all tabs. """
     for tab in driver.window_handles:
         driver.switch_to.window(tab)
         driver.close()
 
-def handle_exceptions(default=None, retry: bool = False):
+# Failures that usually pass if tried again a bit later
+RETRYABLE_ERRORS = (
+    StaleElementReferenceException,
+    ElementClickInterceptedException,
+    ElementNotInteractableException,
+    InvalidElementStateException,
+    TimeoutException,
+)
+RETRYABLE_MESSAGES = ("timed out receiving message from renderer", "target frame detached")
+# The browser is gone, trying again can't help
+PERMANENT_MESSAGES = ("invalid session id", "no such window", "chrome not reachable", "session deleted")
+
+def is_retryable(e: Exception) -> bool:
+    """Check if the error is transient and worth another attempt. """
+    if not isinstance(e, WebDriverException):
+        return False
+    message = (e.msg or "").lower()
+    if any(m in message for m in PERMANENT_MESSAGES):
+        return False
+    return isinstance(e, RETRYABLE_ERRORS) or any(m in message for m in RETRYABLE_MESSAGES)
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class RetryPolicy:
+    """Attempts of an action with jittered exponential backoff between them. """
+    attempts: int = 1
+    base_delay: float = 0.0
+    max_delay: float = 0.0
+
+    @classmethod
+    def for_action(cls, name: str) -> "RetryPolicy":
+        attempts, base_delay = CONFIG.retry[name]
+        return cls(int(attempts), base_delay, CONFIG.retry_max_delay)
+
+    def delay(self, attempt: int) -> float:
+        """Full jitter, so workers that failed together don't retry together. """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def backoff(self, attempt: int, started: float):
+        """Wait before the next attempt, the failed one counts as retry time. """
+        time.sleep(self.delay(attempt))
+        record_retry(time.perf_counter() - started)
+
+def with_retries(res, stats: RetryStats):
+    """Copy of the result with retries made while getting it. """
+    if not isinstance(res, Result) or not stats.count:
+        return res
+    return dataclasses.replace(res, retries=stats.count, retry_time=round(stats.time, 3))
+
+def handle_exceptions(default=None, retry: str | None = None):
     """
     A decorator that catches and logs any exceptions 
     if has exceptions returns a default value.
+    With `retry` failed results and transient errors are
+    tried again as set in retry config for that action.
     """
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            for att in range(2 if retry else 1):
-                try:
-                    res = func(*args, **kwargs)
-                    prdebug(f"{func.__name__} result: {res}")
-
-                    if getattr(res, "success", True):
-                        return res
-                except Exception as e:
-                    tb = traceback.format_exc()
-                    prdebug(f"Exception in {func.__name__}: {e}\n{tb}")
-            return default
+            policy = RetryPolicy.for_action(retry) if retry else RetryPolicy()
+            res = default
+            with retry_stats() as stats:
+                for attempt in range(policy.attempts):
+                    started = time.perf_counter()
+                    try:
+                        res = func(*args, **kwargs)
+                        prdebug(f"{func.__name__} result: {res}")
+
+                        if getattr(res, "success", True):
+                            break
+                        res = default
+                    except Exception as e:
+                        tb = traceback.format_exc()
+                        prdebug(f"Exception in {func.__name__}: {e}\n{tb}")
+                        if not is_retryable(e):
+                            break
+
+                    if attempt + 1 < policy.attempts:
+                        policy.backoff(attempt, started)
+            return with_retries(res, stats)
         return wrapper
     return decorator
 
-def parse_text(el: WebElement | str | None) -> str | None:
-    if el:
-        return el.text.strip() if isinstance(el, WebElement) else el.strip()
-    return None
-
 def parse_attr(el: WebElement | None, attr: str = "class") -> str:
     if el:
         return str(el.get_attribute(attr))
     return ''
 
-@overload
-def parse_num(el: WebElement | str | None, is_percent: Literal[True]) -> float | None: ...
-@overload
-def parse_num(el: WebElement | str | None, is_percent: Literal[False] = False) -> int | None: ...
-def parse_num(el: WebElement | str | None, is_percent: bool = False) -> int | float | None:
-    if el:
-        num = re.search(r'\d+', str(parse_text(el)))
-        if num:
-            res = int(num.group())
-            if is_percent:
-                res = float(res) / 100
-            return res
-    return None
-
 def parse_img(el: WebElement | None) -> str:
     return parse_attr(el, "src")
 
-def parse_currency(el: WebElement | str | None) -> CurrencyType:
-    res = CurrencyType.UNKNOWN
-    tex = str(parse_text(el)).lower()
-
-    words = [w for w in tex.split() if '-' not in w] # ignore mor-lg
-    tex = words[-1]
-
-    if 'чайник' in tex or 'coin' in tex:
-        res = CurrencyType.COIN
-    elif 'мор' in tex or 'mor' in tex:
-        res = CurrencyType.GOLD
-    elif 'рис' in tex or 'rice' in tex:
-        res = CurrencyType.RICE
-    return res
-
 def similarity(a: str, b: str) -> float:
     return SequenceMatcher(None, a, b).ratio()
 
@@ -157,6 +455,13 @@ def random_sleep(amount: float = 2.0, r: float = 0.5):
     """Sleep for certain amount of time with a random jitter. """
     time.sleep(max(0.0, amount + random.uniform(-r, r)))
 
+def pace(name: str):
+    """
+    Deliberate delay between actions set in pacing config,
+    not to be used for waiting for the page.
+    """
+    random_sleep(*CONFIG.pacing[name])
+
 def is_docker():
     """Check if running in a Docker container. """
     cgroup = Path('/proc/self/cgroup')
@@ -165,19 +470,25 @@ def is_docker():
 def scroll_into(driver, element):
     driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
 
-def click_el(driver, element, retries=5):
-    for i in range(retries):
+def click_el(driver, element) -> bool:
+    """Click the element, transient failures are retried as set for clicks. """
+    if not element:
+        return False
+
+    policy = RetryPolicy.for_action("click")
+    for attempt in range(policy.attempts):
+        started = time.perf_counter()
         try:
-            if element:
-                wait_for(Condition.CLICKABLE, WebDriverWait(driver, CONFIG.wait_timeout), element)
-                scroll_into(driver, element)
-                element.click()
-                return True
-        except (ElementClickInterceptedException,
-                StaleElementReferenceException,
-                ElementNotInteractableException,
-                InvalidElementStateException) as e:
-            prdebug(f"Click attempt {i + 1} failed: {e}")
+            wait_for(Condition.CLICKABLE, WebDriverWait(driver, CONFIG.wait_timeout), element)
+            scroll_into(driver, element)
+            element.click()
+            return True
+        except WebDriverException as e:
+            if not is_retryable(e):
+                raise
+            prdebug(f"Click attempt {attempt + 1} failed: {e}")
+            if attempt + 1 < policy.attempts:
+                policy.backoff(attempt, started)
     return False
 
 def get_swal(driver) -> Swal:
@@ -185,29 +496,32 @@ def get_swal(driver) -> Swal:
     wait = WebDriverWait(driver, CONFIG.wait_timeout)
 
     swal = wait_for(Condition.PRESENCE, wait, SwalSelectors.MODAL)
-    time.sleep(0.5) # animation
     if swal:
-        title = find(swal, SwalSelectors.TITLE)
-        text = find(swal, SwalSelectors.TEXT)
-        icon = find(swal, SwalSelectors.ICON)
+        wait_settled(driver, SwalSelectors.MODAL)
+        data = extract(swal, {
+            "title": Query(SwalSelectors.TITLE),
+            "text": Query(SwalSelectors.TEXT),
+            "icon": Query(SwalSelectors.ICON, attr="src"),
+            "content": Query(SwalSelectors.CONTENT, fields={
+                "title": Query(SwalSelectors.CONTENT_TITLE),
+                "text": Query(SwalSelectors.CONTENT_TEXT),
+                "icon": Query(SwalSelectors.CONTENT_ICON, attr="src"),
+            }),
+        })
         
         confirm_button = wait_for(Condition.CLICKABLE, wait, SwalSelectors.CONFIRM_BUTTON)
 
         # Some alerts have content and footer instead of title, text and icon
-        if not title or not text:
-            content = find(swal, SwalSelectors.CONTENT)
-            if content:
-                title = find(content, SwalSelectors.CONTENT_TITLE)
-                text = find(content, SwalSelectors.CONTENT_TEXT)
-                icon = find(content, SwalSelectors.CONTENT_ICON)
-
-        data = Swal(
-            title=parse_text(title),
-            text=parse_text(text),
-            icon=parse_img(icon),
+        if (data["title"] is None or data["text"] is None) and data["content"]:
+            data.update(data["content"])
+
+        res = Swal(
+            title=parse_text(data["title"]),
+            text=parse_text(data["text"]),
+            icon=data["icon"],
             confirm_button=confirm_button
         )
-        prdebug(data)
-        return data
+        prdebug(res)
+        return res
     
     return Swal()
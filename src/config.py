@@ -1,27 +1,52 @@
 import os
+import sqlite3
+import threading
 import tomllib
 import argparse
 
+from contextlib import closing
+
+from src.constants import LEAN_RESOURCE_PATTERNS, PACING, RETRY, RETRY_MAX_DELAY, DEADLINES
+
 class Config:
-    def __init__(self, config_path: str = "config.toml"):
+    def __init__(self, config_path: str = "config.toml", argv: list[str] | None = None):
         """
-        Initialize the Config object, optionally with a config path.
+        Initialize the Config object, optionally with a config path
+        and command line arguments, `sys.argv` is used by default.
         """
-        args = self.parse_args()
+        args = self.parse_args(argv)
         raw = self.load_toml(args.config_path or config_path)
 
         flags = raw.get("flags", {})
         self.headless = args.headless or flags.get("headless", False)
         self.debug = args.debug or flags.get("debug", False)
-        self.checkin = args.checkin or flags.get("checkin", False)
-        self.giveaway = args.giveaway or flags.get("giveaway", False)
-        self.cases = args.cases or flags.get("cases", False)
-        self.sell_inventory = args.sell_inventory or flags.get("sell_inventory", False)
+        self.status = args.status
+        self.daemon = args.daemon or flags.get("daemon", False)
+        self.checkin = not self.status and (args.checkin or flags.get("checkin", False))
+        self.giveaway = not self.status and (args.giveaway or flags.get("giveaway", False))
+        self.cases = not self.status and (args.cases or flags.get("cases", False))
+        self.sell_inventory = not self.status and (args.sell_inventory or flags.get("sell_inventory", False))
 
         general = raw.get("general", {})
         self.wait_timeout = general.get("wait_timeout", 2)
+        self.poll_interval = general.get("poll_interval", 0.1)
+        self.http_reads = args.status or general.get("http_reads", False)
+        self.http_timeout = general.get("http_timeout", 10)
+        self.notification_retries = general.get("notification_retries", 5)
+        self.progress_notifications = general.get("progress_notifications", False)
+        self.catalog_ttl = general.get("catalog_ttl", 600)
+        self.preflight = general.get("preflight", False)
+        self.preflight_workers = general.get("preflight_workers", 16)
+        self.incremental_inventory = general.get("incremental_inventory", False)
+        self.inventory_full_scan_hours = general.get("inventory_full_scan_hours", 168)
+        self.delta_profile = general.get("delta_profile", False)
         self.wait_after = args.wait_after if args.wait_after is not None else general.get("wait_after", 0)
+        self.workers = args.workers if args.workers is not None else general.get("workers", 1)
         self.giveaway_price_threshold = general.get("giveaway_price_threshold", 0)
+        self.giveaway_recheck_hours = general.get("giveaway_recheck_hours", 24)
+        self.giveaway_tabs = general.get("giveaway_tabs", 0)
+        self.case_cooldown_hours = general.get("case_cooldown_hours", 24)
+        self.case_payments_recheck_hours = general.get("case_payments_recheck_hours", 24)
         self.case_price_threshold = general.get("case_price_threshold", 0)
         self.referral_url = args.referral_url or general.get("referral_url", "")
 
@@ -35,6 +60,61 @@ class Config:
         self.sell_ignored = selling.get("sell_ignored", False)
         self.sell_gold_price_threshold = selling.get("sell_gold_price_threshold", 0)
 
+        policy = raw.get("policy", {})
+        self.ignore_items = policy.get("ignore_items", [])
+        self.allow_items = policy.get("allow_items", [])
+        self.ignore_cases = policy.get("ignore_cases", [])
+        self.target_cases = policy.get("target_cases", [])
+
+        browser = raw.get("browser", {})
+        self.reuse_browser = browser.get("reuse", False)
+        self.browser_max_uses = browser.get("max_uses", 0)
+        self.browser_max_memory_mb = browser.get("max_memory_mb", 0)
+        self.lean = args.lean or browser.get("lean", False)
+        self.blocked_resources = browser.get("blocked_resources", ["image", "font", "media", "tracker"])
+        self.blocked_urls = browser.get("blocked_urls", [])
+
+        pacing = raw.get("pacing", {})
+        self.pacing = {
+            name: tuple(pacing.get(name, default))
+            for name, default in PACING.items()
+        }
+
+        retry = raw.get("retry", {})
+        self.retry = {
+            name: tuple(retry.get(name, default))
+            for name, default in RETRY.items()
+        }
+        self.retry_max_delay = retry.get("max_delay", RETRY_MAX_DELAY)
+
+        deadlines = raw.get("deadlines", {})
+        self.deadlines = {
+            name: deadlines.get(name, default)
+            for name, default in DEADLINES.items()
+        }
+
+        daemon = raw.get("daemon", {})
+        self.checkin_reset = daemon.get("checkin_reset", "00:00")
+        self.giveaway_interval_minutes = daemon.get("giveaway_interval_minutes", 30)
+        self.retry_minutes = daemon.get("retry_minutes", 30)
+        self.summary_hours = daemon.get("summary_hours", 24)
+
+        remote = raw.get("remote", {})
+        self.remote_endpoints = [
+            {
+                "url": str(endpoint.get("url", "")).rstrip("/"),
+                "capacity": endpoint.get("capacity", 1),
+                "chromium_path": endpoint.get("chromium_path", ""),
+            }
+            for endpoint in remote.get("endpoints", [])
+        ]
+        self.remote_health_check_seconds = remote.get("health_check_seconds", 30)
+        self.remote_local_fallback = remote.get("local_fallback", False)
+
+        metrics = raw.get("metrics", {})
+        self.metrics_json_path = metrics.get("json_path", "")
+        self.metrics_prometheus_path = metrics.get("prometheus_path", "")
+
         discord = raw.get("discord", {})
         self.webhook_url = args.webhook_url or discord.get("webhook_url", "")
         self.webhook_name = discord.get("profile_name", "")
@@ -48,12 +128,26 @@ class Config:
         self.chromium_path = args.chromium_path or os.path.abspath(paths.get("chromium_path", ""))
         self.chromedriver_path = args.chromedriver_path or os.path.abspath(paths.get("chromedriver_path", ""))
         self.accounts_dir = paths.get("accounts_file", "accounts")
+        self.state_dir = paths.get("state_dir", "state")
+        self.results_path = paths.get("results_path", "")
+        self.sessions_db = paths.get("sessions_db", "")
         self.new_account = args.new_account if args.new_account else None
-        self.accounts = self.load_accounts()
+        # Accounts are listed on first use
+        self._accounts: dict[str, str] | None = None
 
         self.validate()
 
-    def parse_args(self) -> argparse.Namespace:
+    @property
+    def accounts(self) -> dict[str, str]:
+        if self._accounts is None:
+            self._accounts = self.load_accounts()
+        return self._accounts
+
+    @accounts.setter
+    def accounts(self, value: dict[str, str]):
+        self._accounts = value
+
+    def parse_args(self, argv: list[str] | None = None) -> argparse.Namespace:
         """Parse config options for AutoDailies. """
         parser = argparse.ArgumentParser(description="AutoDailies")
 
@@ -64,9 +158,13 @@ class Config:
         parser.add_argument("-g", "--giveaway", action="store_true", help="Runs the giveaway.")
         parser.add_argument("-cs", "--cases", action="store_true", help="Opens the cases.")
         parser.add_argument("-si", "--sell_inventory", action="store_true", help="Sell items from inventory.")
+        parser.add_argument("-s", "--status", action="store_true", help="Only reads profiles without a browser, no actions are run.")
+        parser.add_argument("-D", "--daemon", action="store_true", help="Keeps running and processes accounts when their actions are due.")
+        parser.add_argument("-l", "--lean", action="store_true", help="Blocks images, fonts and trackers while loading pages.")
 
         # General
         parser.add_argument("-w", "--wait-after", type=int, help="Number of seconds to wait before closing the browser.")
+        parser.add_argument("-W", "--workers", type=int, help="Number of accounts to process at once, each with its own browser.")
 
         # Discord
         parser.add_argument("--webhook_url", type=str, help="Discord webhook URL to send logs to.")
@@ -81,7 +179,7 @@ class Config:
             of the new telegram account to be added.")
         parser.add_argument("--referral_url", type=str, help="Referral URL link that you can use for new accounts.")
 
-        return parser.parse_args()
+        return parser.parse_args(argv)
 
     def load_toml(self, user_config: str) -> dict:
         # Check if config file exists
@@ -100,17 +198,30 @@ class Config:
         # Get accounts pkl file paths
         acs =  {
             name: f"{self.accounts_dir}/{name}"
-            for name in os.listdir("accounts")
+            for name in os.listdir(self.accounts_dir)
             if name.endswith(".pkl")
         }
 
+        # Accounts in session store may have no pkl files
+        if self.sessions_db and os.path.exists(self.sessions_db):
+            try:
+                with closing(sqlite3.connect(self.sessions_db)) as db:
+                    for (account,) in db.execute("SELECT account FROM sessions"):
+                        acs.setdefault(f"{account}.pkl", f"{self.accounts_dir}/{account}.pkl")
+            except sqlite3.Error as e:
+                raise ValueError(f"Failed to read accounts from session store {self.sessions_db}: {e}")
+
         # Handle new account
         if self.new_account:
-            if self.new_account not in acs.keys():
+            if f"{self.new_account}.pkl" not in acs.keys():
                 return {self.new_account: f"{self.accounts_dir}/{self.new_account}.pkl"}
             else:
                 raise FileExistsError(f"Account already exists: {self.new_account}.pkl")
 
+        # Check if accounts are not empty
+        if not acs:
+            raise ValueError(f"No accounts are specified. Please ensure there are .pkl files in the accounts directory ({os.path.abspath(self.accounts_dir)}).")
+
         return acs
     
     def validate(self):
@@ -118,6 +229,10 @@ class Config:
         self._validate_values()
     
     def _validate_paths(self):
+        # Browsers run only on remote endpoints
+        if self.remote_endpoints and not self.remote_local_fallback:
+            return
+
         # Check if paths exist
         for path in [self.chromium_path, self.chromedriver_path]:
             if not os.path.exists(path):
@@ -125,18 +240,60 @@ class Config:
 
     def _validate_values(self):
         # Check for negative values
-        for value in [self.giveaway_price_threshold, self.case_price_threshold, self.wait_after, self.wait_timeout]:
+        for value in [self.giveaway_price_threshold, self.giveaway_recheck_hours, self.giveaway_tabs, self.case_price_threshold,
+                      self.case_cooldown_hours, self.case_payments_recheck_hours, self.wait_after, self.wait_timeout,
+                      self.http_timeout, self.notification_retries, self.catalog_ttl, self.inventory_full_scan_hours,
+                      self.browser_max_uses, self.browser_max_memory_mb, self.poll_interval,
+                      self.giveaway_interval_minutes, self.retry_minutes, self.summary_hours, self.retry_max_delay,
+                      self.remote_health_check_seconds,
+                      *self.deadlines.values(), *(v for pace in self.pacing.values() for v in pace[:2])]:
             if value < 0:
                 raise ValueError(f"{value} cannot be negative.")
 
+        # Check for valid pacing values
+        for name, pace in self.pacing.items():
+            if len(pace) != 2:
+                raise ValueError(f"Pacing for {name} must be [seconds, jitter]: {list(pace)}")
+
+        # Check for valid retry values
+        for name, policy in self.retry.items():
+            if len(policy) != 2 or policy[0] < 1 or policy[1] < 0:
+                raise ValueError(f"Retry for {name} must be [attempts, base delay], at least one attempt: {list(policy)}")
+
+        # Check for known resource types
+        for resource in self.blocked_resources:
+            if resource not in LEAN_RESOURCE_PATTERNS:
+                raise ValueError(f"Unknown resource type to block: {resource}. Use one of: {', '.join(LEAN_RESOURCE_PATTERNS)}")
+
+        # Check for valid check-in reset time
+        try:
+            hours, minutes = map(int, self.checkin_reset.split(":"))
+            if not (0 <= hours < 24 and 0 <= minutes < 60):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Check-in reset time must be HH:MM: {self.checkin_reset}")
+
+        # Daemon only runs the actions
+        if self.daemon and (self.status or self.new_account):
+            raise ValueError("Daemon mode can't be used with --status or --new_account")
+
+        # Check for valid worker count
+        if self.workers < 1:
+            raise ValueError(f"Number of workers must be at least 1: {self.workers}")
+        if self.preflight_workers < 1:
+            raise ValueError(f"Number of pre-flight workers must be at least 1: {self.preflight_workers}")
+
+        # Check for valid remote endpoints
+        for endpoint in self.remote_endpoints:
+            if not endpoint["url"].startswith(("http://", "https://")):
+                raise ValueError(f"Invalid remote WebDriver URL: {endpoint['url']}")
+            if endpoint["capacity"] < 1:
+                raise ValueError(f"Capacity of {endpoint['url']} must be at least 1: {endpoint['capacity']}")
+
         # Check for valid URLs
         if self.webhook_url and not self.webhook_url.startswith("https://discord.com/api/webhooks/"):
             raise ValueError(f"Invalid webhook URL: {self.webhook_url}")
 
-        # Check if accounts are not empty
-        if not self.accounts or len(self.accounts) == 0:
-            raise ValueError(f"No accounts are specified. Please ensure there are .pkl files in the accounts directory ({os.path.abspath(self.accounts_dir)}).")
-
         # Check if phone number is valid
         if self.new_account:
             if not self.new_account.isdigit() or not 7 < len(self.new_account) < 17:
@@ -146,4 +303,38 @@ class Config:
         if self.referral_url and not self.referral_url.startswith("https://genshindrop.io/ref/"):
             raise ValueError(f"Invalid referral URL link: {self.referral_url}")
 
-CONFIG: Config = Config()
+class LazyConfig:
+    """
+    Config that is loaded from the command line and config file
+    on first use, so importing modules has no side effects.
+    Use `configure` to set it up from code instead.
+    """
+    def __init__(self):
+        object.__setattr__(self, "_config", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _get(self) -> Config:
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    object.__setattr__(self, "_config", Config())
+        return self._config
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._get(), name, value)
+
+def configure(config: Config | None = None, **overrides) -> Config:
+    """
+    Use the given config, loaded from the command line and
+    config file if not given, with some values overridden.
+    """
+    config = config or CONFIG._get()
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    object.__setattr__(CONFIG, "_config", config)
+    return config
+
+CONFIG: Config = LazyConfig()
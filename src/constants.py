@@ -1,6 +1,5 @@
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
 from enum import Enum
+import os
 
 IGNORE_CASES = [
     # Other
@@ -35,7 +34,7 @@ IGNORE_CASES = [
 
 IGNORE_ITEMS = [
     # Limited items
-    "2021", "2022", "2023", "2024", "2025", "2026"
+    "2021", "2022", "2023", "2024", "2025", "2026",
     "памят",
     "сувенир",
     "фигурк",
@@ -51,10 +50,70 @@ IGNORE_ITEMS = [
     "пак",
 ]
 
-BASE_URL: str = "https://genshindrop.io"
+# URL patterns for resource types blocked in lean mode
+LEAN_RESOURCE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.mp3*", "*.ogg*", "*.wav*"],
+    # Analytics and ad scripts the bot never needs
+    "tracker": [
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*mc.yandex.ru*",
+        "*doubleclick.net*",
+    ],
+}
+
+# Deliberate delays to look less like a bot,
+# (seconds, random jitter) for each pacing point
+PACING = {
+    "giveaway_check": (1.0, 0.5),
+    "giveaway_join": (5.0, 0.5),
+    "case_cooldown": (7.0, 0.5),
+    "sell_confirm": (1.0, 0.5),
+    "sell_cooldown": (2.0, 1.0),
+    "load_more": (1.0, 0.5),
+    "typing": (0.3, 0.1),
+}
+
+# Retries of failed actions, (attempts, base delay in seconds),
+# the delay doubles after every attempt up to the max delay
+RETRY = {
+    "checkin": (2, 1.0),
+    "click": (5, 0.2),
+}
+RETRY_MAX_DELAY = 10.0
+
+# Longest time in seconds each part of the run can take
+# before its browser is killed, 0 to disable
+DEADLINES = {
+    "account": 1800,
+    "login": 600,
+    "profile": 900,
+    "checkin": 120,
+    "giveaway": 900,
+    "cases": 900,
+}
+
+USER_AGENT: str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/145.0.0.0 Safari/537.36"
+
+# Can be pointed to a local copy of the site, for example in benchmarks
+BASE_URL: str = os.environ.get("AUTODAILIES_BASE_URL", "https://genshindrop.io").rstrip("/")
 CHECKIN_URL: str = f"{BASE_URL}/checkin"
 GIVEAWAY_URL: str = f"{BASE_URL}/give"
 PROFILE_URL: str = f"{BASE_URL}/profile"
+TELEGRAM_OAUTH_URL: str = "https://oauth.telegram.org"
+
+class By:
+    """Same locator strategies as selenium's `By`, without importing selenium. """
+    ID = "id"
+    XPATH = "xpath"
+    LINK_TEXT = "link text"
+    PARTIAL_LINK_TEXT = "partial link text"
+    NAME = "name"
+    TAG_NAME = "tag name"
+    CLASS_NAME = "class name"
+    CSS_SELECTOR = "css selector"
 
 class SelEnum(tuple, Enum):
     """Base class for selector enums. """
@@ -97,6 +156,7 @@ class CommonSelectors(SelEnum):
 class LoginSelectors(SelEnum):
     """Selectors for telegram login actions. """
     SECRET_CODE = (By.CLASS_NAME, 'my-secret-code-value_val')
+    SECRET_CODE_MODAL = (By.ID, 'MySecretCode')
     LOGIN_BUTTON = (By.CSS_SELECTOR, "a.header-signin")
     TG_LOGIN_BUTTON = (By.CSS_SELECTOR, 'a.login-button.login-button_telegram')
     
@@ -164,13 +224,20 @@ class InventorySelectors(SelEnum):
 
     LOAD_MORE_BUTTON = (By.XPATH, '//button[contains(@class, "btn") and contains(normalize-space(.), "Больше")]')
 
+def _condition(name: str):
+    """Selenium expected condition, imported only when used. """
+    def condition(locator):
+        from selenium.webdriver.support import expected_conditions as EC
+        return getattr(EC, name)(locator)
+    return staticmethod(condition)
+
 class Condition:
     """
     Conditions for finding the element. 
     """
-    PRESENCE = EC.presence_of_element_located
-    CLICKABLE = EC.element_to_be_clickable
-    VISIBLE = EC.visibility_of_element_located
+    PRESENCE = _condition("presence_of_element_located")
+    CLICKABLE = _condition("element_to_be_clickable")
+    VISIBLE = _condition("visibility_of_element_located")
 
 class CurrencyType(str, Enum):
     COIN = "coin"
@@ -187,6 +254,14 @@ class CaseResultType(str, Enum):
     COOLDOWN_FAILURE = "С момента последнего открытия коробки еще не прошло достаточно времени"
     PAYMENTS_FAILURE = "Выводы и покупки за указанное время не найдены 😔 Необходимо иметь хотя бы один вывод или покупку"
 
+class CaseStatus(str, Enum):
+    """Outcome of opening a case. """
+    OPENED = "opened"
+    SKIPPED = "skipped"
+    COOLDOWN = "cooldown"
+    NO_PAYMENTS = "no_payments"
+    FAILED = "failed"
+
 class GiveawayResultType(str, Enum):
     """
     Result messages for giveaways.
@@ -196,6 +271,15 @@ class GiveawayResultType(str, Enum):
     SUCCESS = "Вы в раздаче"
     FAILURE = "Не получилось"
 
+class GiveawayStatus(str, Enum):
+    """Decision made for a giveaway, kept between runs. """
+    JOINED = "joined"
+    # No join button, might also be a page that didn't load
+    ALREADY_JOINED = "already_joined"
+    REJECTED_PRICE = "rejected_price"
+    REJECTED_CURRENCY = "rejected_currency"
+    FAILED = "failed"
+
 class SellResultType(str, Enum):
     """
     Result messages for selling items.
@@ -1,55 +1,137 @@
-from src.browser import create_driver, load_cookies, save_cookies
-from src.logger import prinfo, prerror, prsuccess, Notifications
-from src.actions.checkin import run_daily_checkin
-from src.actions.giveaway import run_giveaway
-from src.actions.case import run_cases
-from src.actions.profile import run_profile
-from src.actions.login import run_login_tg
-from src.models import RunResult
-from src.common import random_sleep
-from src.config import CONFIG
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from src.logger import prinfo, prerror, prsuccess, prdebug
+from src.models import RunResult, Profile
+from src.reader import fetch_profile, read_cookies
+from src.metrics import collect, span, retry_stats
+from src.sink import ResultSink
+from src.preflight import preflight
+from src.state import AccountState, account_name
+from src.watchdog import DeadlineExceeded, deadline
+from src.config import CONFIG, Config, configure
 from src.constants import BASE_URL
 
-def get_profile(driver, initial=False):
-    res = run_profile(driver, initial=initial)
+# The browser and actions import selenium, they are imported where used
+# so status runs and importing the run API stay light
+if TYPE_CHECKING:
+    from src.browser import DriverPool
+
+def get_profile(driver, initial=False, state: AccountState | None = None):
+    from src.actions.profile import run_profile
+
+    res = run_profile(driver, initial=initial, state=state)
     if res is None or res.id == '':
-        driver.quit()
         return None
 
     return res
 
-def run_once(cookie_file) -> RunResult:
-    """Run specified actions for given pickle file. """
-    driver = create_driver()
-    if driver.current_url != BASE_URL:
-        driver.get(BASE_URL)
-
-    # Inject cookies into browser
-    if cookie_file.split("/")[-1] != f"{CONFIG.new_account}.pkl":
-        result, error = load_cookies(driver, cookie_file)
-        if not result:
-            driver.quit()
-            return RunResult(False, f"{cookie_file}: {error}")
-    else:
-        run_login_tg(driver)
-        save_cookies(driver, cookie_file)
-    driver.refresh()
+def read_profile(cookies: list[dict]) -> Profile | None:
+    """
+    Get profile over HTTP without the browser if enabled,
+    selling items always needs the browser.
+    """
+    if not CONFIG.http_reads or CONFIG.sell_inventory or not cookies:
+        return None
+
+    res = fetch_profile(cookies)
+    if res is None or res.id == '':
+        prdebug("Failed to read profile over HTTP, using the browser")
+        return None
+
+    return res
+
+def enabled_actions() -> set[str]:
+    """Actions enabled in config. """
+    return {
+        name for name, enabled in (
+            ("checkin", CONFIG.checkin),
+            ("giveaway", CONFIG.giveaway),
+            ("cases", CONFIG.cases),
+        ) if enabled
+    }
+
+def run_once(cookie_file, pool: "DriverPool", actions: set[str] | None = None) -> RunResult:
+    """Run specified actions for given pickle file, all enabled by default. """
+    actions = enabled_actions() if actions is None else actions
+    is_new = cookie_file.split("/")[-1] == f"{CONFIG.new_account}.pkl"
+    with span("read_profile"):
+        init_profile = None if is_new else read_profile(read_cookies(cookie_file))
+
+    # Status only, no need for the browser
+    if CONFIG.status and init_profile is not None:
+        return RunResult(success=True, ip=init_profile, p=init_profile)
+
+    state = AccountState(account_name(cookie_file))
+    try:
+        # Killed browsers fail the account and are never returned to the pool
+        with pool.driver() as driver, deadline("account", driver):
+            return run_actions(driver, cookie_file, is_new, init_profile, state, actions)
+    except DeadlineExceeded as e:
+        return RunResult(False, f"{cookie_file}: {e}", timed_out=True)
+    finally:
+        state.save()
+
+def run_actions(
+    driver,
+    cookie_file,
+    is_new: bool,
+    init_profile: Profile | None,
+    state: AccountState,
+    actions: set[str],
+) -> RunResult:
+    """Run actions in a browser borrowed for the account. """
+    from src.browser import load_cookies, save_cookies
+    from src.actions.checkin import run_daily_checkin
+    from src.actions.giveaway import run_giveaway
+    from src.actions.case import run_cases
+    from src.actions.profile import refresh_profile
+    from src.actions.login import run_login_tg
+    from src.common import random_sleep
+
+    with span("load_cookies"):
+        if driver.current_url != BASE_URL:
+            driver.get(BASE_URL)
+
+        # Inject cookies into browser
+        if not is_new:
+            result, error = load_cookies(driver, cookie_file)
+            if not result:
+                return RunResult(False, f"{cookie_file}: {error}")
+        else:
+            with deadline("login"):
+                run_login_tg(driver)
+            save_cookies(driver, cookie_file)
+        driver.refresh()
 
     # Verify if login was successful
-    init_profile = get_profile(driver, initial=True)
+    if init_profile is None:
+        with span("get_profile_initial"), deadline("profile"):
+            init_profile = get_profile(driver, initial=True, state=state)
     if init_profile is None:
         return RunResult(False, f"{cookie_file}: Failed to get profile information")
 
     # Run actions
-    if CONFIG.checkin:
-        checkin = run_daily_checkin(driver)
-    if CONFIG.giveaway:
-        giveaway = run_giveaway(driver)
-    if CONFIG.cases:
-        cases = run_cases(driver)
+    if "checkin" in actions:
+        with span("checkin"), deadline("checkin"):
+            checkin = run_daily_checkin(driver)
+    if "giveaway" in actions:
+        with span("giveaway"), deadline("giveaway"):
+            giveaway = run_giveaway(driver, state)
+    if "cases" in actions:
+        with span("cases"), deadline("cases"):
+            cases = run_cases(driver, state)
 
     # Get profile information after actions
-    curr_profile = get_profile(driver)
+    with span("get_profile"), deadline("profile"):
+        if CONFIG.status:
+            curr_profile = init_profile
+        elif CONFIG.delta_profile:
+            curr_profile = refresh_profile(driver, init_profile, state)
+        else:
+            curr_profile = read_profile(driver.get_cookies()) or get_profile(driver, state=state)
     if curr_profile is None:
         return RunResult(False, f"{cookie_file}: Failed to get profile information")
 
@@ -58,34 +140,79 @@ def run_once(cookie_file) -> RunResult:
         prinfo(f"Waiting {CONFIG.wait_after} seconds before closing the browser...")
         random_sleep(CONFIG.wait_after, 0)
 
-    # Cleanup
-    save_cookies(driver, cookie_file)
-    driver.quit()
+    # Cleanup, the pool resets or quits the browser
+    with span("save_cookies"):
+        save_cookies(driver, cookie_file)
 
     return RunResult(
         success=True,
         ip=init_profile,
         p=curr_profile,
-        checkin=checkin if CONFIG.checkin else None,
-        giveaway=giveaway if CONFIG.giveaway else None,
-        cases=cases if CONFIG.cases else None,
+        checkin=checkin if "checkin" in actions else None,
+        giveaway=giveaway if "giveaway" in actions else None,
+        cases=cases if "cases" in actions else None,
     )
 
-def run():
-    results: list[RunResult] = []
+def run_account(file, pool: "DriverPool", actions: set[str] | None = None) -> RunResult:
+    """
+    Run a single account and report its result,
+    so a failing account never affects the others.
+    """
+    prinfo(f"Processing cookie file: {file}")
+    with collect() as spans, retry_stats() as retries:
+        try:
+            with span("account"):
+                res = run_once(file, pool, actions)
+        except Exception as e:
+            prdebug(f"Exception while processing {file}: {e}\n{traceback.format_exc()}")
+            res = RunResult(False, f"{file}: {e}")
+    res.account = file
+    res.spans = spans
+    # All retries of the account, each action has its own too
+    res.retries = retries.count
+    res.retry_time = round(retries.time, 3)
 
-    # Iterate over all accounts
-    for file in CONFIG.accounts.values():
-        prinfo(f"Processing cookie file: {file}")
-        res = run_once(file)
+    if res.success:
+        prsuccess(f"{file} completed successfully.")
+    elif res.reason:
+        prerror(f"{res.reason}")
+    else:
+        prerror(f"{file} failed for unknown reason.")
 
-        if res.success:
-            prsuccess(f"{file} completed successfully.")
-        elif res.reason:
-            prerror(f"{res.reason}")
-        else:
-            prerror(f"{file} failed for unknown reason.")
+    return res
+
+def run(config: Config | None = None, accounts: list[str] | None = None):
+    """
+    Run enabled actions for the accounts, all accounts in
+    the accounts directory and config from `CONFIG` by default.
+    """
+    if config is not None:
+        configure(config)
+    files = list(accounts) if accounts is not None else list(CONFIG.accounts.values())
+    from src.browser import DriverPool
 
-        results.append(res)
+    pool = DriverPool()
+    sink = ResultSink()
+
+    try:
+        # Don't spend browsers on accounts that are logged out
+        if CONFIG.preflight:
+            files, failed = preflight(files)
+            for res in failed:
+                sink.add(res)
+
+        # Iterate over all accounts, each worker borrows its own browser
+        # and results are handed over as soon as each account is done
+        if CONFIG.workers > 1 and len(files) > 1:
+            prinfo(f"Processing {len(files)} accounts with {CONFIG.workers} workers")
+            with ThreadPoolExecutor(max_workers=CONFIG.workers) as executor:
+                for _ in executor.map(lambda f: sink.add(run_account(f, pool)), files):
+                    pass
+        else:
+            for file in files:
+                sink.add(run_account(file, pool))
+    finally:
+        pool.close()
+        sink.close()
 
-    Notifications(results).send_all()
+    sink.finish()
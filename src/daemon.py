@@ -0,0 +1,169 @@
+import heapq
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from src.actions.giveaway import should_check
+from src.browser import DriverPool
+from src.catalog import CATALOG
+from src.config import CONFIG, Config, configure
+from src.core import enabled_actions, run_account
+from src.logger import prinfo, prdebug
+from src.models import RunResult
+from src.preflight import check_session, mark_relogin
+from src.sink import ResultSink
+from src.state import AccountState, account_name
+
+# Longest sleep, so the summary is sent in time
+MAX_SLEEP = 300
+
+def next_reset(after: float) -> float:
+    """Next time the daily check-in resets after the given time. """
+    hours, minutes = map(int, CONFIG.checkin_reset.split(":"))
+    now = datetime.fromtimestamp(after, timezone.utc)
+    reset = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    if reset <= now:
+        reset += timedelta(days=1)
+    return reset.timestamp()
+
+def due_actions(state: AccountState, now: float) -> set[str]:
+    """Actions of the account that can be run now. """
+    schedule = state.section("schedule")
+    return {name for name in enabled_actions() if schedule.get(name, 0) <= now}
+
+def has_new_giveaways(state: AccountState) -> bool:
+    """Check if any listed giveaway is due for a check, True if unknown. """
+    links = CATALOG.peek("giveaways")
+    if links is None:
+        return True
+    known = state.section("giveaways")
+    return any(should_check(known.get(link)) for link in links)
+
+def reschedule(state: AccountState, actions: set[str], res: RunResult | None, now: float):
+    """Set next time for the actions that were run. """
+    schedule = state.section("schedule")
+    retry = now + CONFIG.retry_minutes * 60
+
+    for name in actions:
+        result = getattr(res, name, None) if res else None
+        if res is not None and (not res.success or (result is not None and not result.success)):
+            schedule[name] = retry
+            continue
+
+        match name:
+            case "checkin":
+                schedule[name] = next_reset(now)
+            case "giveaway":
+                schedule[name] = now + CONFIG.giveaway_interval_minutes * 60
+            case "cases":
+                # Earliest case to become eligible again
+                eligible = [at for at in state.section("cases").values() if at > now]
+                schedule[name] = min(eligible, default=now + CONFIG.case_cooldown_hours * 3600)
+
+def next_due(state: AccountState) -> float:
+    schedule = state.section("schedule")
+    return min((schedule.get(name, 0) for name in enabled_actions()), default=time.time() + MAX_SLEEP)
+
+def process(file: str, pool: DriverPool, report: Callable[[RunResult], None]) -> float:
+    """Run due actions of the account, returns when it's due next. """
+    now = time.time()
+    state = AccountState(account_name(file))
+    actions = due_actions(state, now)
+
+    # Nothing new to join, no need for the browser
+    if actions == {"giveaway"} and not has_new_giveaways(state):
+        prdebug(f"No new giveaways for {file}")
+        reschedule(state, actions, None, now)
+        state.save()
+        return next_due(state)
+
+    # Logged out accounts are checked again later, in case they logged in
+    if actions and CONFIG.preflight:
+        reason = check_session(file)
+        mark_relogin(file, reason)
+        if reason is not None:
+            report(RunResult(False, f"{file}: {reason}, needs to log in again", account=file))
+            return now + CONFIG.retry_minutes * 60
+
+    res = None
+    if actions:
+        prinfo(f"Running {', '.join(sorted(actions))} for {file}")
+        res = run_account(file, pool, actions)
+        report(res)
+
+    # Actions saved their state, so read it again
+    state = AccountState(account_name(file))
+    reschedule(state, actions, res, now)
+    state.save()
+    return next_due(state)
+
+def run_daemon(config: Config | None = None, accounts: list[str] | None = None):
+    """
+    Keep the browser pool running and process every account
+    only when some of its actions become due, instead of
+    processing all accounts at once.
+    """
+    if config is not None:
+        configure(config)
+    # Accounts are due every giveaway interval, keep scraped lists at
+    # least that long, so accounts with no new giveaways skip the browser
+    if CONFIG.catalog_ttl > 0:
+        CONFIG.catalog_ttl = max(CONFIG.catalog_ttl, CONFIG.giveaway_interval_minutes * 60)
+    files = list(accounts) if accounts is not None else list(CONFIG.accounts.values())
+    pool = DriverPool()
+    sink = ResultSink()
+    summary_at = time.time() + CONFIG.summary_hours * 3600
+
+    # Start from the saved schedule, so restarts don't run everything at once
+    queue = [(next_due(AccountState(account_name(file))), file) for file in files]
+    heapq.heapify(queue)
+    running = {}
+
+    # Results always go to the current sink, never to one being finished
+    sink_lock = threading.Lock()
+
+    def report(res: RunResult):
+        with sink_lock:
+            sink.add(res)
+
+    prinfo(f"Running as daemon with {len(files)} accounts and {CONFIG.workers} workers")
+    try:
+        with ThreadPoolExecutor(max_workers=CONFIG.workers) as executor:
+            while True:
+                now = time.time()
+                while queue and queue[0][0] <= now and len(running) < CONFIG.workers:
+                    _, file = heapq.heappop(queue)
+                    running[executor.submit(process, file, pool, report)] = file
+
+                # Sleep until next account is due or a running one is done
+                timeout = MAX_SLEEP
+                if queue and len(running) < CONFIG.workers:
+                    timeout = min(timeout, max(0.0, queue[0][0] - now))
+                if running:
+                    done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    done = set()
+                    time.sleep(timeout)
+
+                for future in done:
+                    file = running.pop(future)
+                    try:
+                        due = future.result()
+                    except Exception as e:
+                        prdebug(f"Failed to schedule {file}: {e}")
+                        due = time.time() + CONFIG.retry_minutes * 60
+                    prdebug(f"{file} is due next at {datetime.fromtimestamp(due)}")
+                    heapq.heappush(queue, (due, file))
+
+                # Summary of the passed period
+                if CONFIG.summary_hours and time.time() >= summary_at:
+                    with sink_lock:
+                        finished, sink = sink, ResultSink()
+                    finished.finish()
+                    summary_at = time.time() + CONFIG.summary_hours * 3600
+    finally:
+        pool.close()
+        sink.close()
@@ -1,9 +1,17 @@
-import requests
+import random
 import re
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 from colorama import Fore, Style
 from src.config import CONFIG
 
+if TYPE_CHECKING:
+    import requests
+
 def _print_log(msg, color = Fore.CYAN, type = "info"):
     print(f"{color}[{type.upper()}]{Style.RESET_ALL} {msg}")
 
@@ -14,90 +22,196 @@ def prerror(msg): _print_log(msg, color = Fore.RED, type = "error")
 def prdebug(msg): _print_log(msg, color = Fore.BLUE, type = "debug") if CONFIG.debug else None
 
 class Notifications:
-    def __init__(self, results: list):
-        self.results = results
+    """
+    Summary of the run, built as results of accounts come in,
+    so only the numbers and text of each account are kept.
+    """
+    def __init__(self, results: list | None = None):
+        self.done = 0
+        self.total = 0
+        self.failed: list[str] = []
+        self.earned_coins = 0
+        self.earned_gold = 0
+        self.all_coins = 0
+        self.all_gold = 0
+        self.reached_target: list[str] = []
+        self.fields: list[dict] = []
+        self._lock = threading.Lock()
+
+        for r in results or []:
+            self.add(r)
 
-        self.summary = self._build_summary()
-        self.accounts_summary = self._build_accounts_summary()
+    def add(self, r) -> dict:
+        """Add result of an account, returns its summary field. """
+        field = self._build_account_field(r)
+        with self._lock:
+            self.total += 1
+            if r.success:
+                self.done += 1
+                self.earned_coins += r.p.balance.coins - r.ip.balance.coins
+                self.earned_gold += r.p.balance.gold - r.ip.balance.gold
+                self.all_coins += r.all_coins
+                self.all_gold += r.all_gold
+            elif r.reason is not None:
+                self.failed.append(r.reason)
+            if r.has_reached_target_gold:
+                self.reached_target.append(r.p.username)
+            self.fields.append(field)
+        return field
+
+    @property
+    def summary(self) -> dict:
+        return self._build_summary()
+
+    @property
+    def accounts_summary(self) -> dict:
+        return {
+            "title": "Accounts Summary",
+            "color": 2818303,
+            "fields": self.fields,
+        }
 
     def send_all(self):
+        self._send_channels(self.summary, self.accounts_summary)
+
+    def send_progress(self, field: dict):
+        """Send summary of a single account as soon as it's done. """
+        self._send_channels(None, {
+            "title": f"Account completed ({self.total})",
+            "color": 2818303,
+            "fields": [field],
+        })
+
+    def _send_channels(self, summary: dict | None, accounts: dict):
+        # Channels are sent at once, chunks of each in order
+        channels = []
         if CONFIG.webhook_url:
-            self._send_discord()
+            channels.append(self._send_discord)
         if CONFIG.telegram_token and CONFIG.telegram_chat_id:
-            self._send_telegram()
+            channels.append(self._send_telegram)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(channels))) as executor:
+            for future in [executor.submit(send, summary, accounts) for send in channels]:
+                future.result()
+
+    def _retry_after(self, r: "requests.Response") -> float | None:
+        """Seconds to wait before retrying, if told by the response. """
+        try:
+            data = r.json()
+        except ValueError:
+            data = {}
+        if isinstance(data, dict):
+            # Discord has it on top, Telegram in parameters
+            retry_after = data.get("retry_after") or (data.get("parameters") or {}).get("retry_after")
+            if retry_after is not None:
+                return float(retry_after)
+        try:
+            return float(r.headers.get("Retry-After", ""))
+        except ValueError:
+            return None
+
+    def _post(self, session: "requests.Session", name: str, url: str, **kwargs) -> bool:
+        """
+        Post a message, retrying when rate limited
+        or when the server fails, returns if it was sent.
+        """
+        import requests
+
+        for attempt in range(CONFIG.notification_retries + 1):
+            # Backoff for failures without a told delay
+            backoff = min(2 ** attempt, 30) * random.uniform(0.5, 1.5)
+            try:
+                r = session.post(url, timeout=CONFIG.http_timeout, **kwargs)
+            except requests.RequestException as e:
+                prdebug(f"Failed to send {name}: {e}")
+                delay = backoff
+            else:
+                if r.ok:
+                    return True
+                if r.status_code != 429 and r.status_code < 500:
+                    prerror(f"Failed to send {name}: {r.status_code} {r.text}")
+                    return False
+                prdebug(f"Failed to send {name}: {r.status_code}")
+                delay = self._retry_after(r) if r.status_code == 429 else None
+                if delay is None:
+                    delay = backoff
+
+            if attempt < CONFIG.notification_retries:
+                prdebug(f"Retrying {name} in {delay:.1f} seconds")
+                time.sleep(delay)
+
+        prerror(f"Failed to send {name} after {CONFIG.notification_retries + 1} attempts")
+        return False
+
+    def _send_discord(self, summary: dict | None, accounts_summary: dict):
+        import requests
 
-    def _send_discord(self):
-        fields = self.accounts_summary["fields"]
+        fields = accounts_summary["fields"]
         chunks = [
             fields[i:i + 25]
             for i in range(0, len(fields), 25)
         ]
 
-        for i, chunk in enumerate(chunks):
-            payload = {}
-            accounts = {**self.accounts_summary, "fields": chunk}
-            if i == 0:
-                payload["embeds"] = [self.summary, accounts]
-            else:
-                payload["embeds"] = [accounts]
+        with requests.Session() as session:
+            for i, chunk in enumerate(chunks):
+                payload = {}
+                accounts = {**accounts_summary, "fields": chunk}
+                if i == 0 and summary:
+                    payload["embeds"] = [summary, accounts]
+                else:
+                    payload["embeds"] = [accounts]
+
+                if CONFIG.webhook_name:
+                    payload["username"] = CONFIG.webhook_name
+                if CONFIG.webhook_avatar:
+                    payload["avatar_url"] = CONFIG.webhook_avatar
 
-            if CONFIG.webhook_name:
-                payload["username"] = CONFIG.webhook_name
-            if CONFIG.webhook_avatar:
-                payload["avatar_url"] = CONFIG.webhook_avatar
+                self._post(session, "Discord webhook", CONFIG.webhook_url, json=payload)
 
-            r = requests.post(CONFIG.webhook_url, json=payload, timeout=5)
-            if not r.ok:
-                prerror(f"Failed to send Discord webhook: {r.status_code} {r.text}")
+    def _send_telegram(self, summary: dict | None, accounts_summary: dict):
+        import requests
 
-    def _send_telegram(self):
-        fields = self.accounts_summary["fields"]
+        fields = accounts_summary["fields"]
         chunks = [
             fields[i:i + 10]
             for i in range(0, len(fields), 10)
         ]
 
-        for i, chunk in enumerate(chunks):
-            data = {}
-            data["chat_id"] = CONFIG.telegram_chat_id
-            accounts = self.embed2text({"title": "", "description": "", "fields": chunk})
-            if i == 0:
-                data["text"] = (
-                    f"{self.embed2text(self.summary)}\n\n" +
-                    f"{accounts}"
-                )
-            else:
-                data["text"] = accounts
-            
-            data["parse_mode"] = "MarkdownV2"
-
-            r = requests.post(
-                f"https://api.telegram.org/bot{CONFIG.telegram_token}/sendMessage",
-                data=data,
-                timeout=5
-            )
-            if not r.ok:
-                prerror(f"Failed to send Telegram message: {r.status_code} {r.text}")
+        with requests.Session() as session:
+            for i, chunk in enumerate(chunks):
+                data = {}
+                data["chat_id"] = CONFIG.telegram_chat_id
+                accounts = self.embed2text({"title": "", "description": "", "fields": chunk})
+                if i == 0 and summary:
+                    data["text"] = (
+                        f"{self.embed2text(summary)}\n\n" +
+                        f"{accounts}"
+                    )
+                else:
+                    data["text"] = accounts
+
+                data["parse_mode"] = "MarkdownV2"
+
+                url = f"https://api.telegram.org/bot{CONFIG.telegram_token}/sendMessage"
+                self._post(session, "Telegram message", url, data=data)
 
     def _build_summary(self) -> dict:
-        results = self.results
-        d = f"Accounts Done: `{len([r for r in results if r.success])}/{len(results)}`\n"
+        d = f"Accounts Done: `{self.done}/{self.total}`\n"
 
-        if any(r for r in results if not r.success):
+        if self.failed:
             d += "Failed Accounts:"
-            for r in results:
-                if not r.success and r.reason is not None:
-                    d += f"\n{r.reason}"
+            for reason in self.failed:
+                d += f"\n{reason}"
             d += "\n\n"
         d += (
-            f"Earned Coins: `{sum(i.p.balance.coins - i.ip.balance.coins for i in results if i.success)}`\n"
-            f"Earned Gold: `{sum(i.p.balance.gold - i.ip.balance.gold for i in results if i.success)}`\n"
-            f"All Coins: `{sum(i.all_coins for i in results if i.success)}`\n"
-            f"All Gold: `{sum(i.all_gold for i in results if i.success)}`\n\n"
+            f"Earned Coins: `{self.earned_coins}`\n"
+            f"Earned Gold: `{self.earned_gold}`\n"
+            f"All Coins: `{self.all_coins}`\n"
+            f"All Gold: `{self.all_gold}`\n\n"
         )
-        if any(i for i in results if i.has_reached_target_gold):
+        if self.reached_target:
             d += (
-                f"Reached target for gold: {', '.join([i.p.username for i in results if i.has_reached_target_gold])}"
+                f"Reached target for gold: {', '.join(self.reached_target)}"
             )
 
         return {
@@ -106,69 +220,60 @@ class Notifications:
             "description": d,
         }
 
-    def _build_accounts_summary(self) -> dict:
-        results = self.results
-        fields = []
-        accounts = {
-            "title": "Accounts Summary",
-            "color": 2818303,
-            "fields": fields
-        }
-
-        # Construct accounts summary
-        for r in results:
-            value = ""
-            value += "```diff\n"
+    def _build_account_field(self, r) -> dict:
+        """Construct summary of a single account. """
+        value = ""
+        value += "```diff\n"
+        value += (
+            f"Coins: {r.all_coins} | Gold: {r.all_gold}\n"
+        )
+        if r.checkin:
             value += (
-                f"Coins: {r.all_coins} | Gold: {r.all_gold}\n"
+                f"Streak: {r.checkin.streak} "
+                f"| M: {r.checkin.monthly_bonus * 100}% "
+                f"| P: {r.checkin.payments_bonus * 100}% "
+                f"{'| Day was skipped! ' if r.checkin.skipped_day else ' '}"
+                f"{'(already checked in)' if r.checkin.already_checked_in else ''}"
+                f"{'(failed)' if not r.checkin.success else ''}"
+                f"\n"
             )
-            if r.checkin:
-                value += (
-                    f"Streak: {r.checkin.streak} "
-                    f"| M: {r.checkin.monthly_bonus * 100}% "
-                    f"| P: {r.checkin.payments_bonus * 100}% "
-                    f"{'| Day was skipped! ' if r.checkin.skipped_day else ' '}"
-                    f"{'(failed)' if not r.checkin.success else ''}"
-                    f"\n"
-                )
-            if r.cases:
-                value += (
-                    f"Cases opened: "
-                    f"{r.cases.opened_cases}/{len(r.cases.available_cases)} "
-                    f"({r.cases.ignored_cases} ignored) "
-                    f"{'(failed)' if not r.cases.success else ''}"
-                    f"\n"
-                )
-            if r.giveaway:
-                value += (
-                    f"Giveaways joined: "
-                    f"{len(r.giveaway.joined)}/{len(r.giveaway.giveaways)} "
-                    f"{'(failed)' if not r.giveaway.success else ''}"
-                    f"\n"
-                )
-            if len(r.p.inventory_meta.sold_items) > 0:
-                value += (
-                    f"Sold items ({len(r.p.inventory_meta.sold_items)}): {', '.join(r.p.inventory_meta.sold_items)} "
-                    f"\n"
-                )
+        if r.cases:
             value += (
-                "Inventory value:\n"
-                f"{self._diff_text('coins', r.ip.inventory_meta.all_coins, r.p.inventory_meta.all_coins)}"
-                f"{self._diff_text('gold', r.ip.inventory_meta.all_gold, r.p.inventory_meta.all_gold)}"
-                "Balance:\n"
-                f"{self._diff_text('coins', r.ip.balance.coins, r.p.balance.coins)}"
-                f"{self._diff_text('gold', r.ip.balance.gold, r.p.balance.gold)}"
-                f"{self._diff_text('rice', r.ip.rice, r.p.rice)}"
+                f"Cases opened: "
+                f"{r.cases.opened_cases}/{len(r.cases.available_cases)} "
+                f"({r.cases.ignored_cases} ignored"
+                f"{f', {r.cases.waiting_cases} waiting' if r.cases.waiting_cases else ''}) "
+                f"{'(failed)' if not r.cases.success else ''}"
+                f"\n"
             )
-            value += "```\n"
-
-            fields.append({
-                "name": f"{r.p.username} ({r.p.id})",
-                "value": value,
-                "inline": False,
-            })
+        if r.giveaway:
+            value += (
+                f"Giveaways joined: "
+                f"{len(r.giveaway.joined)}/{len(r.giveaway.giveaways)} "
+                f"{'(failed)' if not r.giveaway.success else ''}"
+                f"\n"
+            )
+        if len(r.p.inventory_meta.sold_items) > 0:
+            value += (
+                f"Sold items ({len(r.p.inventory_meta.sold_items)}): {', '.join(r.p.inventory_meta.sold_items)} "
+                f"\n"
+            )
+        value += (
+            "Inventory value:\n"
+            f"{self._diff_text('coins', r.ip.inventory_meta.all_coins, r.p.inventory_meta.all_coins)}"
+            f"{self._diff_text('gold', r.ip.inventory_meta.all_gold, r.p.inventory_meta.all_gold)}"
+            "Balance:\n"
+            f"{self._diff_text('coins', r.ip.balance.coins, r.p.balance.coins)}"
+            f"{self._diff_text('gold', r.ip.balance.gold, r.p.balance.gold)}"
+            f"{self._diff_text('rice', r.ip.rice, r.p.rice)}"
+        )
+        value += "```\n"
 
-        return accounts
+        return {
+            "name": f"{r.p.username} ({r.p.id})",
+            "value": value,
+            "inline": False,
+        }
 
     def _diff_text(self, label: str, init_val: int, curr_val: int) -> str:
         """Generates a diff stylized text. """
@@ -0,0 +1,160 @@
+import functools
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+from src.config import CONFIG
+from src.logger import prinfo, prerror
+from src.models import RunResult, Span
+
+_local = threading.local()
+
+@contextmanager
+def collect():
+    """Collect spans recorded in this thread into a list. """
+    spans: list[Span] = []
+    prev = getattr(_local, "spans", None), getattr(_local, "stack", None)
+    _local.spans, _local.stack = spans, []
+    try:
+        yield spans
+    finally:
+        _local.spans, _local.stack = prev
+
+@contextmanager
+def span(name: str):
+    """Time a phase, recorded only while collecting. """
+    spans = getattr(_local, "spans", None)
+    if spans is None:
+        yield
+        return
+
+    stack: list[str] = _local.stack
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        spans.append(Span(
+            name=name,
+            parent=parent,
+            start=started_at,
+            duration=time.perf_counter() - start,
+        ))
+
+def timed(name: str | None = None):
+    """A decorator that times every call of the function. """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@dataclass(slots=True)
+class RetryStats:
+    count: int = 0
+    # Seconds spent in failed attempts and waiting after them
+    time: float = 0.0
+
+@contextmanager
+def retry_stats():
+    """Count retries made in this thread, nested counts are added to outer ones. """
+    stats = RetryStats()
+    parent = getattr(_local, "retries", None)
+    _local.retries = stats
+    try:
+        yield stats
+    finally:
+        _local.retries = parent
+        if parent is not None:
+            parent.count += stats.count
+            parent.time += stats.time
+
+def record_retry(seconds: float):
+    """Count a retry in this thread, recorded only while counting. """
+    stats = getattr(_local, "retries", None)
+    if stats is not None:
+        stats.count += 1
+        stats.time += seconds
+
+def _write_atomic(path: str, text: str):
+    """Write file so readers never see it half written. """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def to_json(results: list[RunResult]) -> str:
+    return json.dumps({
+        "timestamp": time.time(),
+        "accounts": [
+            {
+                "account": r.account,
+                "success": r.success,
+                "reason": r.reason,
+                "retries": r.retries,
+                "retry_time": r.retry_time,
+                "spans": [asdict(s) for s in r.spans],
+            }
+            for r in results
+        ],
+    }, ensure_ascii=False, indent=2)
+
+def to_prometheus(results: list[RunResult]) -> str:
+    # Aggregate by phase, per account labels would be too many
+    phases: dict[str, list[float]] = {}
+    for r in results:
+        for s in r.spans:
+            phases.setdefault(s.name, []).append(s.duration)
+
+    lines = [
+        "# HELP autodailies_phase_seconds_sum Time spent in each phase during the last run.",
+        "# TYPE autodailies_phase_seconds_sum gauge",
+    ]
+    lines += [f'autodailies_phase_seconds_sum{{phase="{name}"}} {sum(d):.6f}' for name, d in phases.items()]
+    lines += [
+        "# HELP autodailies_phase_seconds_max Longest single run of each phase during the last run.",
+        "# TYPE autodailies_phase_seconds_max gauge",
+    ]
+    lines += [f'autodailies_phase_seconds_max{{phase="{name}"}} {max(d):.6f}' for name, d in phases.items()]
+    lines += [
+        "# HELP autodailies_phase_count Number of times each phase ran during the last run.",
+        "# TYPE autodailies_phase_count gauge",
+    ]
+    lines += [f'autodailies_phase_count{{phase="{name}"}} {len(d)}' for name, d in phases.items()]
+    lines += [
+        "# HELP autodailies_accounts Number of processed accounts during the last run.",
+        "# TYPE autodailies_accounts gauge",
+        f'autodailies_accounts{{status="success"}} {sum(1 for r in results if r.success)}',
+        f'autodailies_accounts{{status="failed"}} {sum(1 for r in results if not r.success)}',
+        "# HELP autodailies_retries Number of retries after transient failures during the last run.",
+        "# TYPE autodailies_retries gauge",
+        f"autodailies_retries {sum(r.retries for r in results)}",
+        "# HELP autodailies_retry_seconds Time spent on retries during the last run.",
+        "# TYPE autodailies_retry_seconds gauge",
+        f"autodailies_retry_seconds {sum(r.retry_time for r in results):.6f}",
+        "# HELP autodailies_last_run_timestamp_seconds Time when the last run finished.",
+        "# TYPE autodailies_last_run_timestamp_seconds gauge",
+        f"autodailies_last_run_timestamp_seconds {time.time():.3f}",
+    ]
+    return "\n".join(lines) + "\n"
+
+def export(results: list[RunResult]):
+    """Export run metrics to the files set in config. """
+    try:
+        if CONFIG.metrics_json_path:
+            _write_atomic(CONFIG.metrics_json_path, to_json(results))
+            prinfo(f"Metrics saved to {CONFIG.metrics_json_path}")
+        if CONFIG.metrics_prometheus_path:
+            _write_atomic(CONFIG.metrics_prometheus_path, to_prometheus(results))
+            prinfo(f"Prometheus metrics saved to {CONFIG.metrics_prometheus_path}")
+    except OSError as e:
+        prerror(f"Failed to export metrics: {e}")
@@ -1,13 +1,19 @@
-from selenium.webdriver.remote.webelement import WebElement
 from dataclasses import dataclass, field, fields
+from typing import TYPE_CHECKING
 
-from src.constants import CurrencyType
+from src.constants import CurrencyType, SelEnum
 from src.config import CONFIG
 
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webelement import WebElement
+
 @dataclass(slots=True)
 class Result:
     success: bool
     reason: str | None = None
+    # Attempts made again after transient failures and time spent on them
+    retries: int = 0
+    retry_time: float = 0.0
 
     def __post_init__(self):
         if self.success and self.reason is not None:
@@ -20,12 +26,39 @@ class Result:
             if getattr(self, f.name) is not None
         )
 
+@dataclass(slots=True)
+class Query:
+    """
+    Value to extract from the page with `extract`.
+
+    Returns text of the element found by `sel` (or of the root
+    if no selector), `attr` value instead of text if set,
+    or whether the element exists if `exists` is set.
+    With `fields` returns a dict of nested queries for the element.
+    With `multiple` returns a list of results for every element.
+    """
+    sel: SelEnum | None = None
+    attr: str | None = None
+    exists: bool = False
+    multiple: bool = False
+    fields: dict[str, "Query"] | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "by": self.sel.by if self.sel else None,
+            "val": self.sel.val if self.sel else None,
+            "attr": self.attr,
+            "exists": self.exists,
+            "multiple": self.multiple,
+            "fields": {k: q.to_dict() for k, q in self.fields.items()} if self.fields else None,
+        }
+
 @dataclass(slots=True)
 class Swal:
     title: str | None = None
     text: str | None = None
     icon: str | None = None
-    confirm_button: WebElement | None = None
+    confirm_button: "WebElement | None" = None
     
     def click_confirm(self) -> bool:
         if self.confirm_button:
@@ -40,6 +73,8 @@ class Case:
     is_target: bool
     image: str | None = None
     name: str | None = None
+    # Price in coins shown on the main page
+    price: int | None = None
 
 @dataclass(slots=True)
 class Balance:
@@ -53,6 +88,8 @@ class InventoryItem:
     price: int | None = None
     currency_type: CurrencyType = CurrencyType.UNKNOWN
     sold: bool = False
+    # Identity of the item on the page
+    key: str | None = None
 
 @dataclass(slots=True)
 class InventoryMeta:
@@ -86,6 +123,8 @@ class CheckinResult(Result):
     monthly_bonus: float = 0.0
     payments_bonus: float = 0.0
     skipped_day: bool = False
+    # No check-in button, the day was already claimed
+    already_checked_in: bool = False
     earned: int = 0
     currency_type: CurrencyType = CurrencyType.UNKNOWN
 
@@ -94,14 +133,29 @@ class CasesResult(Result):
     available_cases: list[Case] = field(default_factory=list)
     opened_cases: int = 0
     ignored_cases: int = 0
+    # Cases skipped until they can be opened again
+    waiting_cases: int = 0
 
 @dataclass(slots=True)
 class GiveawayResult(Result):
     giveaways: list[str] = field(default_factory=list)
     joined: list[str] = field(default_factory=list)
 
+@dataclass(slots=True)
+class Span:
+    name: str
+    parent: str | None = None
+    # Unix time when started
+    start: float = 0.0
+    duration: float = 0.0
+
 @dataclass(slots=True)
 class RunResult(Result):
+    # Cookie file of the account
+    account: str | None = None
+    # Browser was killed after running past its deadline
+    timed_out: bool = False
+
     # Initial Profile
     ip: Profile = field(default_factory=lambda: Profile(id=''))
     # Profile
@@ -111,6 +165,8 @@ class RunResult(Result):
     giveaway: GiveawayResult | None = None
     cases: CasesResult | None = None
 
+    spans: list[Span] = field(default_factory=list)
+
     @property
     def all_coins(self) -> int:
         return self.p.balance.coins + self.p.inventory_meta.all_coins
@@ -0,0 +1,48 @@
+import functools
+import re
+
+from typing import TYPE_CHECKING, overload, Literal
+
+from src.constants import CurrencyType
+
+if TYPE_CHECKING:
+    from selenium.webdriver.remote.webelement import WebElement
+
+def parse_text(el: "WebElement | str | None") -> str | None:
+    if el:
+        return el.strip() if isinstance(el, str) else el.text.strip()
+    return None
+
+@overload
+def parse_num(el: "WebElement | str | None", is_percent: Literal[True]) -> float | None: ...
+@overload
+def parse_num(el: "WebElement | str | None", is_percent: Literal[False] = False) -> int | None: ...
+def parse_num(el: "WebElement | str | None", is_percent: bool = False) -> int | float | None:
+    if el:
+        num = re.search(r'\d+', str(parse_text(el)))
+        if num:
+            res = int(num.group())
+            if is_percent:
+                res = float(res) / 100
+            return res
+    return None
+
+def parse_currency(el: "WebElement | str | None") -> CurrencyType:
+    return _parse_currency(str(parse_text(el)))
+
+@functools.lru_cache(maxsize=4096)
+def _parse_currency(text: str) -> CurrencyType:
+    """Currency of the text, cached as the same few texts repeat. """
+    res = CurrencyType.UNKNOWN
+    words = [w for w in text.lower().split() if '-' not in w] # ignore mor-lg
+    if not words:
+        return res
+    tex = words[-1]
+
+    if 'чайник' in tex or 'coin' in tex:
+        res = CurrencyType.COIN
+    elif 'мор' in tex or 'mor' in tex:
+        res = CurrencyType.GOLD
+    elif 'рис' in tex or 'rice' in tex:
+        res = CurrencyType.RICE
+    return res
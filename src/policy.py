@@ -0,0 +1,139 @@
+import re
+
+from dataclasses import dataclass, field
+
+from src.config import CONFIG
+from src.constants import IGNORE_ITEMS, IGNORE_CASES, CurrencyType, GiveawayStatus
+from src.models import Case, InventoryItem
+
+def compile_patterns(patterns: list[str]) -> re.Pattern | None:
+    """Single case insensitive regex matching any of the substrings. """
+    unique = sorted({p.lower() for p in patterns if p}, key=len, reverse=True)
+    if not unique:
+        return None
+    return re.compile("|".join(re.escape(p) for p in unique), re.IGNORECASE)
+
+def case_slug(link: str) -> str:
+    return link.rstrip("/").split("/")[-1].lower()
+
+@dataclass(slots=True)
+class Policy:
+    """
+    Decisions on what to sell, open and join, with ignore lists
+    compiled once, so deciding for each record is a single lookup.
+    """
+    ignore_items: list[str] = field(default_factory=lambda: list(IGNORE_ITEMS))
+    # Items that are sold even if they match ignored ones
+    allow_items: list[str] = field(default_factory=list)
+    ignore_cases: list[str] = field(default_factory=lambda: list(IGNORE_CASES))
+    target_cases: list[str] = field(default_factory=list)
+
+    sell_inventory: bool = False
+    sell_ignored: bool = False
+    sell_gold: bool = False
+    sell_gold_price_threshold: int = 0
+    case_price_threshold: int = 0
+    giveaway_price_threshold: int = 0
+
+    _ignored_re: re.Pattern | None = field(init=False, default=None)
+    _allowed_re: re.Pattern | None = field(init=False, default=None)
+    _ignored_cases: frozenset[str] = field(init=False, default=frozenset())
+    _target_cases: frozenset[str] = field(init=False, default=frozenset())
+
+    def __post_init__(self):
+        self._ignored_re = compile_patterns(self.ignore_items)
+        self._allowed_re = compile_patterns(self.allow_items)
+        self._ignored_cases = frozenset(c.lower() for c in self.ignore_cases if c)
+        self._target_cases = frozenset(c.lower() for c in self.target_cases if c)
+
+    @classmethod
+    def from_config(cls, config) -> "Policy":
+        return cls(
+            ignore_items=[*IGNORE_ITEMS, *config.ignore_items],
+            allow_items=list(config.allow_items),
+            ignore_cases=[*IGNORE_CASES, *config.ignore_cases],
+            target_cases=[*config.target_cases, config.target_case],
+            sell_inventory=config.sell_inventory,
+            sell_ignored=config.sell_ignored,
+            sell_gold=config.sell_gold,
+            sell_gold_price_threshold=config.sell_gold_price_threshold,
+            case_price_threshold=config.case_price_threshold,
+            giveaway_price_threshold=config.giveaway_price_threshold,
+        )
+
+    def is_ignored_item(self, name: str) -> bool:
+        if self._ignored_re is None or not self._ignored_re.search(name):
+            return False
+        return self._allowed_re is None or not self._allowed_re.search(name)
+
+    def should_sell(self, i: InventoryItem) -> bool:
+        """Check if item from user's inventory should be sold. """
+        if not self.sell_inventory:
+            return False
+        if not self.sell_ignored and self.is_ignored_item(i.name):
+            return False
+
+        match i.currency_type:
+            case CurrencyType.GOLD:
+                return self.sell_gold and i.price is not None and i.price <= self.sell_gold_price_threshold
+            case CurrencyType.COIN:
+                return True
+        return False
+
+    def sell_decisions(self, items: list[InventoryItem]) -> list[bool]:
+        """Decide for all items at once, before anything is clicked. """
+        if not self.sell_inventory:
+            return [False] * len(items)
+        return [self.should_sell(i) for i in items]
+
+    def is_ignored_case(self, link: str) -> bool:
+        return case_slug(link) in self._ignored_cases
+
+    def is_target_case(self, link: str) -> bool:
+        return case_slug(link) in self._target_cases
+
+    def cases_to_open(self, cases: list[Case]) -> list[Case]:
+        """Cases worth opening, the ones with known high price are left out. """
+        return [
+            c for c in cases
+            if c.is_target or (not c.is_ignored and (c.price is None or c.price <= self.case_price_threshold))
+        ]
+
+    def case_price_ok(self, price: int | None) -> bool:
+        return price is None or price <= self.case_price_threshold
+
+    def giveaway_rejection(self, price: int | None, currency: CurrencyType) -> GiveawayStatus | None:
+        """Reason not to join a giveaway, None if it should be joined. """
+        if currency is CurrencyType.GOLD:
+            return GiveawayStatus.REJECTED_CURRENCY
+        if price and currency is CurrencyType.COIN and price > self.giveaway_price_threshold:
+            return GiveawayStatus.REJECTED_PRICE
+        return None
+
+def policy_key(config) -> tuple:
+    """Config values the policy is compiled from. """
+    return (
+        tuple(config.ignore_items),
+        tuple(config.allow_items),
+        tuple(config.ignore_cases),
+        tuple(config.target_cases),
+        config.target_case,
+        config.sell_inventory,
+        config.sell_ignored,
+        config.sell_gold,
+        config.sell_gold_price_threshold,
+        config.case_price_threshold,
+        config.giveaway_price_threshold,
+    )
+
+def get_policy() -> Policy:
+    """
+    Policy of the current config, compiled on first use
+    and again whenever values it's made from are changed.
+    """
+    key = policy_key(CONFIG)
+    cached = getattr(CONFIG, "_policy", None)
+    if cached is None or cached[0] != key:
+        cached = (key, Policy.from_config(CONFIG))
+        CONFIG._policy = cached
+    return cached[1]
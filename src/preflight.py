@@ -0,0 +1,68 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from src.config import CONFIG
+from src.constants import BASE_URL
+from src.logger import prinfo, prwarn
+from src.models import RunResult
+from src.reader import read_cookies, probe_session
+from src.state import AccountState, account_name
+
+def site_cookies(cookies: list[dict], now: float) -> list[dict]:
+    """Cookies of the site that have not expired yet. """
+    host = urlparse(BASE_URL).hostname or ""
+    return [
+        cookie for cookie in cookies
+        if host.endswith(cookie.get("domain", host).lstrip("."))
+        and (not cookie.get("expiry") or cookie["expiry"] > now)
+    ]
+
+def check_session(cookie_file: str) -> str | None:
+    """Check cookies of the account, returns why they are invalid. """
+    cookies = read_cookies(cookie_file)
+    if not cookies:
+        return "No cookies found"
+
+    if not site_cookies(cookies, time.time()):
+        return "Cookies expired"
+
+    # Unreachable site is not the account's fault, let the browser try
+    if probe_session(cookies) is False:
+        return "Not logged in"
+
+    return None
+
+def mark_relogin(cookie_file: str, reason: str | None):
+    """Remember whether the account needs to log in again. """
+    state = AccountState(account_name(cookie_file))
+    session = state.section("session")
+    session["checked_at"] = time.time()
+    session["relogin"] = reason is not None
+    session["reason"] = reason
+    state.save()
+
+def preflight(files: list[str]) -> tuple[list[str], list[RunResult]]:
+    """
+    Check sessions of all accounts at once without a browser,
+    returns accounts to run and results of the failed ones.
+    """
+    new_file = f"{CONFIG.new_account}.pkl"
+    to_check = [f for f in files if f.split("/")[-1] != new_file]
+    with ThreadPoolExecutor(max_workers=CONFIG.preflight_workers) as executor:
+        reasons = dict(zip(to_check, executor.map(check_session, to_check)))
+
+    valid, failed = [], []
+    for file in files:
+        reason = reasons.get(file)
+        if file in reasons:
+            mark_relogin(file, reason)
+        if reason is None:
+            valid.append(file)
+        else:
+            prwarn(f"{file}: {reason}, log in again with --new_account")
+            failed.append(RunResult(False, f"{file}: {reason}, needs to log in again", account=file))
+
+    prinfo(f"Pre-flight check: {len(valid)}/{len(files)} sessions are valid")
+    return valid, failed
@@ -0,0 +1,329 @@
+import re
+import functools
+
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING
+from urllib.parse import urljoin
+
+from src.config import CONFIG
+from src.constants import PROFILE_URL, USER_AGENT, SelEnum, \
+    StateSelectors, ProfileSelectors, InventorySelectors
+from src.parsing import parse_num, parse_text, parse_currency
+from src.logger import prdebug
+from src.sessions import load_session
+
+if TYPE_CHECKING:
+    import requests
+from src.models import Balance, InventoryItem, Profile
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+# Selectors that are xpaths in the browser,
+# (css selector, text check, search whole document)
+XPATH_EQUIVALENTS = {
+    ProfileSelectors.ID: ("span", lambda n: "ID" in n.own_text, True),
+    InventorySelectors.CURRENCY_TYPE: ("span[class*=icur-container] i", None, False),
+    InventorySelectors.LOAD_MORE_BUTTON: ("button[class*=btn]", lambda n: "Больше" in n.text, True),
+}
+
+COMPOUND_RE = re.compile(
+    r"\.(?P<cls>[\w-]+)"
+    r"|#(?P<id>[\w-]+)"
+    r"|\[(?P<attr>[\w-]+)(?:(?P<op>[*^$]?=)['\"]?(?P<val>[^'\"\]]*)['\"]?)?\]"
+)
+
+class Node:
+    """Minimal DOM node for reading pages without a browser. """
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: dict[str, str], parent: "Node | None" = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: list["Node | str"] = []
+        self.parent = parent
+
+    @property
+    def classes(self) -> set[str]:
+        return set(self.attrs.get("class", "").split())
+
+    @property
+    def text(self) -> str:
+        parts = []
+        stack: list[Node | str] = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            elif node.tag not in ("script", "style"):
+                stack.extend(reversed(node.children))
+        return " ".join(" ".join(parts).split())
+
+    @property
+    def own_text(self) -> str:
+        return " ".join(" ".join(c for c in self.children if isinstance(c, str)).split())
+
+    @property
+    def root(self) -> "Node":
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def descendants(self):
+        stack = [c for c in reversed(self.children) if isinstance(c, Node)]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(c for c in reversed(node.children) if isinstance(c, Node))
+
+    def find(self, sel: SelEnum, multiple: bool = False):
+        """Find elements like selenium `find` does. """
+        res = select(self, sel)
+        if multiple:
+            return res
+        return res[0] if res else None
+
+class DOMBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document", {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {k: v or "" for k, v in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Node(tag, {k: v or "" for k, v in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # Close unclosed children as browsers do
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+def parse_html(html: str) -> Node:
+    builder = DOMBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+def _compile_compound(compound: str):
+    tag = re.match(r"[a-zA-Z][\w-]*|\*", compound)
+    rest = compound[tag.end():] if tag else compound
+    checks = []
+    for m in COMPOUND_RE.finditer(rest):
+        checks.append(m.groupdict())
+    if "".join(m.group() for m in COMPOUND_RE.finditer(rest)) != rest:
+        raise ValueError(f"Unsupported css selector: {compound}")
+
+    tag_name = tag.group().lower() if tag and tag.group() != "*" else None
+
+    def match(node: Node) -> bool:
+        if tag_name and node.tag != tag_name:
+            return False
+        for c in checks:
+            if c["cls"] and c["cls"] not in node.classes:
+                return False
+            if c["id"] and node.attrs.get("id") != c["id"]:
+                return False
+            if c["attr"]:
+                value = node.attrs.get(c["attr"])
+                if value is None:
+                    return False
+                match c["op"]:
+                    case "=" if value != c["val"]:
+                        return False
+                    case "*=" if c["val"] not in value:
+                        return False
+                    case "^=" if not value.startswith(c["val"]):
+                        return False
+                    case "$=" if not value.endswith(c["val"]):
+                        return False
+        return True
+
+    return match
+
+@functools.lru_cache(maxsize=None)
+def _compile_css(css: str):
+    """Compile a css selector with descendant and child combinators. """
+    parts = []
+    combinator = " "
+    for token in re.findall(r">|[^\s>]+", css):
+        if token == ">":
+            combinator = ">"
+            continue
+        parts.append((combinator, _compile_compound(token)))
+        combinator = " "
+
+    def matches(node: Node, i: int) -> bool:
+        if not parts[i][1](node):
+            return False
+        if i == 0:
+            return True
+        combinator = parts[i][0]
+        parent = node.parent
+        while parent is not None:
+            if matches(parent, i - 1):
+                return True
+            if combinator == ">":
+                return False
+            parent = parent.parent
+        return False
+
+    return lambda node: matches(node, len(parts) - 1)
+
+def select(scope: Node, sel: SelEnum) -> list[Node]:
+    """Select descendants of the scope node with the selector. """
+    check = None
+    match sel.by:
+        case "class name":
+            css = f".{sel.val}"
+        case "tag name":
+            css = sel.val
+        case "id":
+            css = f"#{sel.val}"
+        case "css selector":
+            css = sel.val
+        case "xpath":
+            if sel not in XPATH_EQUIVALENTS:
+                raise ValueError(f"Unsupported xpath selector: {sel}")
+            css, check, absolute = XPATH_EQUIVALENTS[sel]
+            if absolute:
+                scope = scope.root
+        case _:
+            raise ValueError(f"Unsupported selector: {sel}")
+
+    match = _compile_css(css)
+    return [
+        node for node in scope.descendants()
+        if match(node) and (check is None or check(node))
+    ]
+
+def create_session(cookies: list[dict]) -> "requests.Session":
+    """Create a HTTP session logged in with the browser cookies. """
+    import requests
+
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    for cookie in cookies:
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+        )
+    return session
+
+def read_cookies(cookie_file) -> list[dict]:
+    """Read cookies of the account, empty if can't be read. """
+    try:
+        return load_session(cookie_file)
+    except Exception as e:
+        prdebug(f"Failed to read cookies from {cookie_file}: {e}")
+        return []
+
+def parse_profile(html: str) -> Profile | None:
+    """
+    Parse profile page into a profile, returns None if not
+    logged in or if the whole inventory is not on the page.
+    """
+    doc = parse_html(html)
+    box = doc.find(ProfileSelectors.PANEL_BOX)
+    id_el = doc.find(ProfileSelectors.ID)
+    if box is None or id_el is None:
+        prdebug("Profile not found in page, not logged in?")
+        return None
+
+    # Rest of the inventory is only loaded by the browser
+    if doc.find(InventorySelectors.LOAD_MORE_BUTTON):
+        prdebug("Inventory has more pages, can't read it without a browser")
+        return None
+
+    avatar = box.find(ProfileSelectors.AVATAR)
+    username = box.find(ProfileSelectors.USERNAME)
+    rice = box.find(ProfileSelectors.RICE)
+    verified = box.find(ProfileSelectors.IS_VERIFIED)
+    gold = doc.find(StateSelectors.GOLD)
+    coins = doc.find(StateSelectors.COINS)
+
+    inventory = []
+    for item in doc.find(InventorySelectors.ITEM_BOX, multiple=True):
+        name = item.find(InventorySelectors.NAME)
+        if name is None:
+            continue
+        image = item.find(InventorySelectors.IMAGE)
+        price = item.find(InventorySelectors.PRICE)
+        currency = item.find(InventorySelectors.CURRENCY_TYPE)
+        inventory.append(InventoryItem(
+            name=name.text,
+            image=urljoin(PROFILE_URL, image.attrs.get("src", "")) if image else None,
+            price=parse_num(price.text if price else None),
+            currency_type=parse_currency(currency.attrs.get("class") if currency else None),
+        ))
+
+    return Profile(
+        id=id_el.text.split("ID")[-1].strip(),
+        avatar_url=urljoin(PROFILE_URL, avatar.attrs.get("src", "")) if avatar else None,
+        username=parse_text(username.text if username else None),
+        rice=parse_num(rice.text if rice else None),
+        is_verified="true" in verified.attrs.get("class", "") if verified else None,
+        balance=Balance(
+            gold=parse_num(gold.text if gold else None) or 0,
+            coins=parse_num(coins.text if coins else None) or 0,
+        ),
+        inventory=inventory,
+    )
+
+def fetch_profile(cookies: list[dict]) -> Profile | None:
+    """
+    Get user's profile over HTTP without a browser,
+    returns None if it can't be fully read this way.
+    """
+    import requests
+
+    try:
+        with create_session(cookies) as session:
+            r = session.get(PROFILE_URL, timeout=CONFIG.http_timeout)
+            if not r.ok:
+                prdebug(f"Failed to fetch profile: {r.status_code}")
+                return None
+            return parse_profile(r.text)
+    except requests.RequestException as e:
+        prdebug(f"Failed to fetch profile: {e}")
+    return None
+
+def probe_session(cookies: list[dict]) -> bool | None:
+    """
+    Check if cookies are still logged in with a single request,
+    returns None if it can't be told, like when the site couldn't
+    be reached, rate limited or showed a challenge.
+    """
+    import requests
+
+    try:
+        with create_session(cookies) as session:
+            r = session.get(PROFILE_URL, timeout=CONFIG.http_timeout)
+    except requests.RequestException as e:
+        prdebug(f"Failed to probe session: {e}")
+        return None
+    if not 200 <= r.status_code < 300:
+        prdebug(f"Failed to probe session: {r.status_code}")
+        return None
+
+    # Logged out users are redirected away from the profile
+    if r.history and r.url.rstrip("/") != PROFILE_URL.rstrip("/"):
+        return False
+
+    doc = parse_html(r.text)
+    return doc.find(ProfileSelectors.PANEL_BOX) is not None and doc.find(ProfileSelectors.ID) is not None
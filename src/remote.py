@@ -0,0 +1,103 @@
+import threading
+import time
+
+from dataclasses import dataclass
+
+from selenium.common.exceptions import WebDriverException
+
+from src.config import CONFIG
+from src.logger import prinfo, prwarn, prdebug
+
+@dataclass(slots=True, eq=False)
+class Endpoint:
+    url: str
+    # Browsers that can run on it at once
+    capacity: int = 1
+    # Browser binary on the remote host, its default if empty
+    chromium_path: str = ""
+    in_use: int = 0
+    healthy: bool = True
+    # Monotonic time of the last health check
+    checked_at: float = float("-inf")
+
+def check_endpoint(url: str) -> bool:
+    """Check if WebDriver server is ready for new sessions. """
+    import requests
+
+    try:
+        res = requests.get(f"{url}/status", timeout=CONFIG.http_timeout)
+        res.raise_for_status()
+        return bool(res.json().get("value", {}).get("ready", False))
+    except (requests.RequestException, ValueError, AttributeError) as e:
+        prdebug(f"Health check of {url} failed: {e}")
+        return False
+
+class RemoteEndpoints:
+    """
+    Remote WebDriver servers from config, browsers are started
+    on the least loaded healthy one with a free slot, endpoints
+    that fail are skipped until their health check passes again.
+    Safe to use from many workers.
+    """
+    def __init__(self, endpoints: list[dict]):
+        self.endpoints = [Endpoint(**e) for e in endpoints]
+        self._cond = threading.Condition()
+
+    @property
+    def capacity(self) -> int:
+        return sum(e.capacity for e in self.endpoints)
+
+    def _is_healthy(self, endpoint: Endpoint) -> bool:
+        """Health of the endpoint, checked again once the last check is old. """
+        if time.monotonic() - endpoint.checked_at < CONFIG.remote_health_check_seconds:
+            return endpoint.healthy
+
+        healthy = check_endpoint(endpoint.url)
+        with self._cond:
+            if healthy != endpoint.healthy:
+                if healthy:
+                    prinfo(f"Remote WebDriver {endpoint.url} is back")
+                else:
+                    prwarn(f"Remote WebDriver {endpoint.url} is not ready, skipping it")
+            endpoint.healthy = healthy
+            endpoint.checked_at = time.monotonic()
+        return healthy
+
+    def reserve(self) -> Endpoint | None:
+        """
+        Reserve a slot on the least loaded healthy endpoint,
+        None if all are busy. Raises WebDriverException if none are healthy.
+        """
+        with self._cond:
+            free = sorted(
+                (e for e in self.endpoints if e.in_use < e.capacity),
+                key=lambda e: e.in_use / e.capacity,
+            )
+
+        # Health is checked outside the lock, it's a request
+        for endpoint in free:
+            if not self._is_healthy(endpoint):
+                continue
+            with self._cond:
+                if endpoint.healthy and endpoint.in_use < endpoint.capacity:
+                    endpoint.in_use += 1
+                    return endpoint
+
+        with self._cond:
+            if not any(e.healthy for e in self.endpoints):
+                raise WebDriverException("No healthy remote WebDriver endpoints")
+        return None
+
+    def release(self, endpoint: Endpoint, failed: bool = False):
+        """Free the slot, a failed endpoint isn't used until it's healthy again. """
+        with self._cond:
+            endpoint.in_use = max(0, endpoint.in_use - 1)
+            if failed:
+                endpoint.healthy = False
+                endpoint.checked_at = time.monotonic()
+            self._cond.notify_all()
+
+    def wait(self, timeout: float = 1.0):
+        """Wait until a slot is freed, or the timeout to look for idle browsers. """
+        with self._cond:
+            self._cond.wait(timeout)
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from src.config import CONFIG
+from src.logger import prinfo, prdebug
+from src.state import account_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    account TEXT PRIMARY KEY,
+    cookies TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    -- Earliest expiry of the cookies, NULL if all are session cookies
+    expires_at REAL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at);
+"""
+
+def digest(cookies: list[dict]) -> str:
+    """Digest of cookies that doesn't depend on their order. """
+    canonical = sorted(
+        json.dumps(cookie, sort_keys=True, ensure_ascii=False)
+        for cookie in cookies
+    )
+    return hashlib.sha256("\n".join(canonical).encode("utf-8")).hexdigest()
+
+def earliest_expiry(cookies: list[dict]) -> float | None:
+    expiries = [cookie["expiry"] for cookie in cookies if cookie.get("expiry")]
+    return min(expiries) if expiries else None
+
+class SessionStore:
+    """
+    Cookies of all accounts in a single SQLite database,
+    all of them are read at once on start and only changed
+    sessions are written, each in its own transaction.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+        # Bulk load, accounts are then read from memory
+        self._cookies: dict[str, list[dict]] = {}
+        self._digests: dict[str, str] = {}
+        self._updated: dict[str, float] = {}
+        for account, cookies, d, updated_at in self._db.execute(
+            "SELECT account, cookies, digest, updated_at FROM sessions"
+        ):
+            self._cookies[account] = json.loads(cookies)
+            self._digests[account] = d
+            self._updated[account] = updated_at
+
+    def __contains__(self, account: str) -> bool:
+        return account in self._cookies
+
+    def accounts(self) -> list[str]:
+        return list(self._cookies)
+
+    def get(self, account: str) -> list[dict] | None:
+        cookies = self._cookies.get(account)
+        return [dict(cookie) for cookie in cookies] if cookies is not None else None
+
+    def expires_at(self, account: str) -> float | None:
+        cookies = self._cookies.get(account)
+        return earliest_expiry(cookies) if cookies else None
+
+    def save(self, account: str, cookies: list[dict]) -> bool:
+        """Save cookies of the account if they changed, returns if written. """
+        d = digest(cookies)
+        with self._lock:
+            if self._digests.get(account) == d:
+                return False
+
+            now = time.time()
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO sessions (account, cookies, digest, expires_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (account) DO UPDATE SET cookies = excluded.cookies, "
+                    "digest = excluded.digest, expires_at = excluded.expires_at, "
+                    "updated_at = excluded.updated_at",
+                    (account, json.dumps(cookies, ensure_ascii=False), d, earliest_expiry(cookies), now),
+                )
+            self._cookies[account] = [dict(cookie) for cookie in cookies]
+            self._digests[account] = d
+            self._updated[account] = now
+            return True
+
+    def import_pickles(self, directory: str) -> int:
+        """
+        Import `.pkl` files that are new or were changed
+        since they were imported, returns imported count.
+        """
+        if not os.path.isdir(directory):
+            return 0
+
+        imported = 0
+        for name in os.listdir(directory):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(directory, name)
+            account = account_name(path)
+            if os.path.getmtime(path) <= self._updated.get(account, 0):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    cookies = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError) as e:
+                prdebug(f"Failed to import {path}: {e}")
+                continue
+            self.save(account, cookies)
+            imported += 1
+
+        if imported:
+            prinfo(f"Imported {imported} accounts into {self.path}")
+        return imported
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+_store: SessionStore | None = None
+_store_lock = threading.Lock()
+# Digests of pickle files read or written by this process
+_pickle_digests: dict[str, str] = {}
+
+def get_store() -> SessionStore | None:
+    """Session store if enabled in config, opened on first use. """
+    global _store
+    if not CONFIG.sessions_db:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore(CONFIG.sessions_db)
+            _store.import_pickles(CONFIG.accounts_dir)
+        return _store
+
+def load_session(cookie_file: str) -> list[dict]:
+    """
+    Load cookies of the account from the session store or its
+    pickle file, raises FileNotFoundError if there are none.
+    """
+    store = get_store()
+    if store is not None:
+        cookies = store.get(account_name(cookie_file))
+        if cookies is None:
+            raise FileNotFoundError("Cookie file not found.")
+        return cookies
+
+    with open(cookie_file, "rb") as f:
+        cookies = pickle.load(f)
+    _pickle_digests[cookie_file] = digest(cookies)
+    return cookies
+
+def save_session(cookie_file: str, cookies: list[dict]) -> bool:
+    """Save cookies of the account only if changed, returns if written. """
+    store = get_store()
+    if store is not None:
+        return store.save(account_name(cookie_file), cookies)
+
+    d = digest(cookies)
+    if _pickle_digests.get(cookie_file) == d:
+        return False
+
+    # Write to a temporary file first, so it's never left half written
+    tmp = f"{cookie_file}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(cookies, f)
+    os.replace(tmp, cookie_file)
+    _pickle_digests[cookie_file] = d
+    return True
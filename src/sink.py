@@ -0,0 +1,69 @@
+import json
+import os
+import threading
+import time
+
+from dataclasses import asdict
+
+from src.config import CONFIG
+from src.logger import prinfo, prerror, Notifications
+from src.metrics import export
+from src.models import RunResult
+
+class ResultSink:
+    """
+    Takes results of accounts as soon as they are done, writes
+    them to a JSON lines file and adds them to the summary, so
+    nothing but the summary is kept in memory until the end.
+    """
+    def __init__(self):
+        self.notifications = Notifications()
+        # Only what metrics need, without profiles
+        self.metrics: list[RunResult] = []
+        self._lock = threading.Lock()
+        self._file = None
+
+        if CONFIG.results_path:
+            try:
+                self._file = open(CONFIG.results_path, "a", encoding="utf-8")
+            except OSError as e:
+                prerror(f"Failed to open results file: {e}")
+
+    def add(self, res: RunResult):
+        """Save result of an account. Safe to use from many workers. """
+        field = self.notifications.add(res)
+        with self._lock:
+            self.metrics.append(RunResult(
+                res.success, res.reason, res.retries, res.retry_time,
+                account=res.account, spans=res.spans,
+            ))
+            self._write(res)
+
+        if CONFIG.progress_notifications:
+            self.notifications.send_progress(field)
+
+    def _write(self, res: RunResult):
+        if self._file is None:
+            return
+
+        try:
+            line = json.dumps({"timestamp": time.time(), **asdict(res)}, ensure_ascii=False, default=str)
+            self._file.write(line + "\n")
+            # Make sure it's on disk if the run crashes later
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            prerror(f"Failed to write result of {res.account}: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                prinfo(f"Results saved to {CONFIG.results_path}")
+
+    def finish(self):
+        """Send the summary and export metrics of the whole run. """
+        self.close()
+        export(self.metrics)
+        self.notifications.send_all()
@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+
+from pathlib import Path
+
+from src.config import CONFIG
+from src.logger import prdebug, prerror
+
+def account_name(cookie_file: str) -> str:
+    """Name of the account from its cookie file. """
+    return Path(cookie_file).stem
+
+class AccountState:
+    """
+    State of an account kept between runs, like its inventory
+    snapshot, saved as a JSON file in the state directory.
+    """
+    def __init__(self, account: str):
+        self.account = account
+        self.path = os.path.join(CONFIG.state_dir, f"{account}.json")
+        self._lock = threading.Lock()
+        self.data: dict = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            prerror(f"Failed to load state of {self.account}, starting fresh: {e}")
+            return {}
+
+    def section(self, name: str) -> dict:
+        """Get a section of the state, created if missing. """
+        with self._lock:
+            return self.data.setdefault(name, {})
+
+    def save(self):
+        """Save the state, so it's never left half written. """
+        with self._lock:
+            try:
+                os.makedirs(CONFIG.state_dir, exist_ok=True)
+                tmp = f"{self.path}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+                prdebug(f"Saved state of {self.account}")
+            except OSError as e:
+                prerror(f"Failed to save state of {self.account}: {e}")
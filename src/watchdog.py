@@ -0,0 +1,125 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from src.config import CONFIG
+from src.logger import prerror, prdebug
+
+# Seconds between deadline checks
+INTERVAL = 1.0
+
+class DeadlineExceeded(Exception):
+    """Browser was killed because a deadline passed. """
+    def __init__(self, name: str, seconds: float):
+        super().__init__(f"{name} timed out after {seconds:g} seconds")
+        self.name = name
+        self.seconds = seconds
+
+@dataclass(slots=True, eq=False)
+class Deadline:
+    name: str
+    seconds: float
+    # Monotonic time when it passes
+    at: float
+    driver: object
+
+class Watchdog:
+    """
+    Background thread that force kills browsers running past
+    their deadline, a hung renderer then fails the account
+    instead of stalling the run. Safe to use from many workers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deadlines: set[Deadline] = set()
+        # Ids of killed drivers with the deadline that killed them
+        self._killed: dict[int, Deadline] = {}
+        self._thread: threading.Thread | None = None
+        self._local = threading.local()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watchdog", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(INTERVAL)
+            now = time.monotonic()
+            with self._lock:
+                expired = [
+                    d for d in self._deadlines
+                    if d.at <= now and id(d.driver) not in self._killed
+                ]
+                for d in expired:
+                    self._killed[id(d.driver)] = d
+
+            for d in expired:
+                prerror(f"{d.name} timed out after {d.seconds:g} seconds, killing the browser")
+                try:
+                    # Imported here, the browser imports modules that use deadlines
+                    from src.browser import kill_driver
+                    kill_driver(d.driver)
+                except Exception as e:
+                    prdebug(f"Failed to kill browser: {e}")
+
+    def _stack(self) -> list[Deadline]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def deadline(self, name: str, driver=None):
+        """
+        Kill the browser if the block runs longer than set for `name`
+        in deadlines config, raises DeadlineExceeded once it's killed.
+        Without `driver` the browser of the enclosing deadline is used.
+        """
+        stack = self._stack()
+        seconds = CONFIG.deadlines.get(name, 0)
+        if driver is None and stack:
+            driver = stack[-1].driver
+        if not seconds or driver is None:
+            yield
+            return
+
+        self._start()
+        d = Deadline(name, seconds, time.monotonic() + seconds, driver)
+        with self._lock:
+            self._deadlines.add(d)
+        stack.append(d)
+        try:
+            yield
+        finally:
+            stack.pop()
+            with self._lock:
+                self._deadlines.discard(d)
+                killed = self._killed.get(id(driver))
+                # Outermost deadline of the driver, it's done with it
+                if not any(s.driver is driver for s in stack):
+                    self._killed.pop(id(driver), None)
+            if killed is not None:
+                raise DeadlineExceeded(killed.name, killed.seconds)
+
+    def time_left(self) -> float | None:
+        """Seconds until the nearest deadline in this thread, None if none. """
+        stack = self._stack()
+        if not stack:
+            return None
+        return min(d.at for d in stack) - time.monotonic()
+
+WATCHDOG = Watchdog()
+
+def deadline(name: str, driver=None):
+    return WATCHDOG.deadline(name, driver)
+
+def time_left() -> float | None:
+    return WATCHDOG.time_left()
+
+def out_of_time() -> bool:
+    """Check if the nearest deadline in this thread has passed. """
+    left = time_left()
+    return left is not None and left <= 0